@@ -0,0 +1,113 @@
+import copy
+from typing import Dict, List
+
+
+class BuildGraph:
+    """The builds of a target file indexed by name.
+
+    The topological order and the transitive requirements of every build are computed once, when the graph is
+    created, so lookups during generation are constant time.
+    """
+
+    def __init__(self, builds: List[Dict]):
+        self.builds = {}
+        for build in builds:
+            self.builds[build["name"]] = build
+
+        for build in builds:
+            for required in build.get("requires", []):
+                if required not in self.builds:
+                    raise RuntimeError(
+                        f"{build['name']} requires {required}, which does not match any build name."
+                    )
+
+        # Requirements always come before the builds that require them.
+        self.order = self._topological_order()
+        self.position = {name: index for index, name in enumerate(self.order)}
+
+        self.closure = {}
+        for name in self.order:
+            closure = set()
+            for required in self.builds[name].get("requires", []):
+                closure.add(required)
+                closure.update(self.closure[required])
+            self.closure[name] = sorted(closure, key=self.position.get)
+
+        # The libraries a build has to link against. A static library's requirements are not linked into it, so they
+        # have to be linked by whatever requires it. A dynamic library has already been linked against its own
+        # requirements, so they are not linked again.
+        self.link_closure = {}
+        for name in self.order:
+            closure = set()
+            for required in self.builds[name].get("requires", []):
+                closure.add(required)
+                if self.builds[required]["buildRule"] == "staticlib":
+                    closure.update(self.link_closure[required])
+            self.link_closure[name] = sorted(
+                closure, key=self.position.get, reverse=True
+            )
+
+        self.dependants = {name: [] for name in self.order}
+        for name in self.order:
+            for required in self.builds[name].get("requires", []):
+                self.dependants[required].append(name)
+
+    def _topological_order(self):
+        order = []
+        visited = set()
+
+        for root in self.builds:
+            if root in visited:
+                continue
+
+            # An iterative depth first search, so long dependency chains can not hit the recursion limit.
+            path = [root]
+            on_path = {root}
+            stack = [iter(self.builds[root].get("requires", []))]
+            while stack:
+                for required in stack[-1]:
+                    if required in on_path:
+                        cycle = path[path.index(required) :] + [required]
+                        raise RuntimeError(
+                            f"Dependency cycle detected: {' -> '.join(cycle)}."
+                        )
+                    if required not in visited:
+                        path.append(required)
+                        on_path.add(required)
+                        stack.append(iter(self.builds[required].get("requires", [])))
+                        break
+                else:
+                    stack.pop()
+                    name = path.pop()
+                    on_path.remove(name)
+                    visited.add(name)
+                    order.append(name)
+
+        return order
+
+    def rebind(self, builds: List[Dict]) -> "BuildGraph":
+        # The same graph over different copies of the builds, for example one per variant. The order and closures
+        # are shared rather than computed again.
+        graph = copy.copy(self)
+        graph.builds = {build["name"]: build for build in builds}
+        return graph
+
+    def find(self, build_name) -> Dict:
+        try:
+            return self.builds[build_name]
+        except KeyError:
+            raise RuntimeError(f"Failed to find build with name: {build_name}")
+
+    def requires(self, build_name) -> List[Dict]:
+        return [self.builds[name] for name in self.find(build_name).get("requires", [])]
+
+    def transitive_requires(self, build_name) -> List[Dict]:
+        # Ordered so that every build comes before the builds that require it.
+        return [self.builds[name] for name in self.closure[build_name]]
+
+    def link_requires(self, build_name) -> List[Dict]:
+        # Ordered so that every library comes before the libraries it requires, which is the order linkers need.
+        return [self.builds[name] for name in self.link_closure[build_name]]
+
+    def sorted_builds(self) -> List[Dict]:
+        return [self.builds[name] for name in self.order]
@@ -0,0 +1,231 @@
+import hashlib
+import os
+import shutil
+import sys
+import threading
+import time
+from pathlib import Path
+
+# This module is imported by the compile cache, which runs for every compile. The http modules are only imported when
+# they are used.
+
+# Seconds to wait for a connection to a remote cache, and then for each read or write once connected, before giving
+# up and building locally.
+HttpConnectTimeout = 2
+HttpTimeout = 10
+
+# Seconds that a remote cache is skipped for after it could not be reached. Every compile and link runs in its own
+# process, so the failure is remembered in a file.
+RemoteRetryAfter = 60
+
+
+def copy_file(source: Path, destination: Path):
+    # Copy to a temporary file and rename, so readers never see a partially written file.
+    destination.parent.mkdir(parents=True, exist_ok=True)
+    temporary = destination.parent / f".{destination.name}.{os.getpid()}.tmp"
+    try:
+        shutil.copyfile(str(source), str(temporary))
+        os.replace(str(temporary), str(destination))
+    except OSError:
+        if temporary.exists():
+            temporary.unlink()
+        raise
+
+
+class CacheBackend:
+    # A store of build artifacts addressed by a key. A backend must never fail a build. Any error is treated as a
+    # miss when reading and ignored when writing.
+
+    def get(self, key: str, destination: Path) -> bool:
+        raise NotImplementedError
+
+    def put(self, key: str, source: Path):
+        raise NotImplementedError
+
+
+class DirectoryBackend(CacheBackend):
+    # A directory shared between machines, for example over NFS.
+
+    def __init__(self, path: Path):
+        self.path = path
+
+    def artifact_path(self, key: str) -> Path:
+        return self.path / key[:2] / key
+
+    def get(self, key: str, destination: Path) -> bool:
+        try:
+            copy_file(self.artifact_path(key), destination)
+            return True
+        except OSError:
+            return False
+
+    def put(self, key: str, source: Path):
+        try:
+            copy_file(source, self.artifact_path(key))
+        except OSError:
+            pass
+
+
+class HttpBackend(CacheBackend):
+    # Artifacts are read with `GET <url>/<key>` and written with `PUT <url>/<key>`. Any server that stores the body of
+    # a PUT and serves it back on GET can be used.
+
+    def __init__(self, url: str, state_dir: Path = None):
+        self.url = url.rstrip("/")
+        self.marker_path = None
+        if state_dir:
+            digest = hashlib.sha1(self.url.encode("utf-8")).hexdigest()[:16]
+            self.marker_path = state_dir / f"unreachable-{digest}"
+
+    def is_unreachable(self) -> bool:
+        if not self.marker_path:
+            return False
+        try:
+            return time.time() - self.marker_path.stat().st_mtime < RemoteRetryAfter
+        except OSError:
+            return False
+
+    def mark_unreachable(self):
+        if not self.marker_path:
+            return
+        try:
+            self.marker_path.parent.mkdir(parents=True, exist_ok=True)
+            self.marker_path.touch()
+        except OSError:
+            pass
+
+    def request(self, method: str, key: str, body: bytes = None):
+        # Returns the status and body of the response, or None if the remote could not be reached.
+        import http.client
+        import urllib.parse
+
+        if self.is_unreachable():
+            return None
+
+        url = urllib.parse.urlsplit(f"{self.url}/{key}")
+        connection_class = (
+            http.client.HTTPSConnection
+            if url.scheme == "https"
+            else http.client.HTTPConnection
+        )
+        connection = connection_class(
+            url.hostname, url.port, timeout=HttpConnectTimeout
+        )
+        try:
+            connection.connect()
+            connection.sock.settimeout(HttpTimeout)
+            connection.request(method, url.path, body=body)
+            response = connection.getresponse()
+            return response.status, response.read()
+        except (http.client.HTTPException, OSError):
+            self.mark_unreachable()
+            return None
+        finally:
+            connection.close()
+
+    def get(self, key: str, destination: Path) -> bool:
+        response = self.request("GET", key)
+        if not response or response[0] != 200:
+            return False
+
+        destination.parent.mkdir(parents=True, exist_ok=True)
+        temporary = destination.parent / f".{destination.name}.{os.getpid()}.tmp"
+        try:
+            temporary.write_bytes(response[1])
+            os.replace(str(temporary), str(destination))
+        except OSError:
+            if temporary.exists():
+                temporary.unlink()
+            return False
+        return True
+
+    def put(self, key: str, source: Path):
+        try:
+            data = source.read_bytes()
+        except OSError:
+            return
+        self.request("PUT", key, data)
+
+
+def make_backend(location: str, state_dir: Path = None) -> CacheBackend:
+    # `state_dir` is where an http backend remembers that it could not be reached.
+    if location.startswith("http://") or location.startswith("https://"):
+        return HttpBackend(location, state_dir)
+    if location.startswith("file://"):
+        location = location[len("file://") :]
+    return DirectoryBackend(Path(location))
+
+
+def is_key(key: str):
+    return len(key) > 2 and all(char in "0123456789abcdef" for char in key)
+
+
+class CacheRequestHandler:
+    # Mixed into http.server's BaseHTTPRequestHandler by serve().
+    store: DirectoryBackend = None
+
+    def do_GET(self):
+        key = self.path.strip("/")
+        if not is_key(key):
+            self.send_error(400)
+            return
+
+        path = self.store.artifact_path(key)
+        if not path.is_file():
+            self.send_error(404)
+            return
+
+        data = path.read_bytes()
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_PUT(self):
+        key = self.path.strip("/")
+        if not is_key(key):
+            self.send_error(400)
+            return
+
+        length = int(self.headers.get("Content-Length", 0))
+        data = self.rfile.read(length)
+        path = self.store.artifact_path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Requests are handled on several threads of the same process.
+        temporary = path.parent / f".{path.name}.{threading.get_ident()}.tmp"
+        temporary.write_bytes(data)
+        os.replace(str(temporary), str(path))
+        self.send_response(201)
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        pass
+
+
+def make_server(directory: Path, port: int):
+    # A minimal stand-in for a remote cache server. Useful for testing and for small teams. Port 0 picks a free port,
+    # see the server's server_port.
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    handler = type(
+        "Handler",
+        (CacheRequestHandler, BaseHTTPRequestHandler),
+        {"store": DirectoryBackend(directory)},
+    )
+    return ThreadingHTTPServer(("", port), handler)
+
+
+def serve(directory: Path, port: int):
+    server = make_server(directory, port)
+    print(
+        f"Serving the artifact cache in {str(directory)} on port {server.server_port}..."
+    )
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 4 or sys.argv[1] != "serve":
+        print("usage: python -m aim_build.cachebackends serve <directory> <port>")
+        sys.exit(2)
+
+    serve(Path(sys.argv[2]), int(sys.argv[3]))
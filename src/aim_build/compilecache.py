@@ -0,0 +1,392 @@
+# A content addressed compile cache.
+#
+# When a target enables `compileCache`, the compile rule runs the compiler through this module:
+#
+#     python -m aim_build.compilecache compile <compiler> <args...>
+#
+# The cache key is a hash of the compiler's identity, the compiler arguments (excluding the output and depfile paths)
+# and the preprocessed source. Objects are stored in a local directory and evicted, least recently used first, when
+# the cache grows beyond its maximum size.
+#
+# Archives, shared libraries and executables can be cached too:
+#
+#     python -m aim_build.compilecache artifact <output> <command> <args...>
+#
+# Their key is a hash of the command, with every input file replaced by a hash of its content.
+#
+# Both commands accept `--remote <location>` before the command, naming a remote backend (an http(s) URL or a shared
+# directory) that is tried when the local cache misses and is updated with everything that gets built.
+import hashlib
+import os
+import random
+import shutil
+import subprocess
+import sys
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+from aim_build.cachebackends import CacheBackend, copy_file, make_backend
+
+DefaultMaxSize = 5 * 1024**3
+
+# After storing an object, the cache is pruned with this probability. This keeps the size in check without having
+# to track the size of the cache on every compile.
+PruneProbability = 0.01
+
+# Every compile appends an event to the stats file. Once it grows beyond this many bytes, the events are replaced by
+# one count per kind of event.
+MaxStatsSize = 64 * 1024
+
+
+def get_cache_dir() -> Path:
+    cache_dir = os.environ.get("AIM_CACHE_DIR", None)
+    if cache_dir:
+        return Path(cache_dir)
+    return Path.home() / ".cache" / "aim"
+
+
+def parse_size(size: str) -> int:
+    units = {"K": 1024, "M": 1024**2, "G": 1024**3, "T": 1024**4}
+    size = size.strip().upper()
+    if size and size[-1] in units:
+        return int(float(size[:-1]) * units[size[-1]])
+    return int(size)
+
+
+def get_max_size() -> int:
+    max_size = os.environ.get("AIM_CACHE_SIZE", None)
+    if max_size:
+        return parse_size(max_size)
+    return DefaultMaxSize
+
+
+def format_size(size: int) -> str:
+    for unit in ["B", "KiB", "MiB", "GiB"]:
+        if size < 1024:
+            return f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} TiB"
+
+
+class CompileCache(CacheBackend):
+    def __init__(self, cache_dir: Path = None, max_size: int = None):
+        self.cache_dir = cache_dir if cache_dir else get_cache_dir()
+        self.max_size = max_size if max_size else get_max_size()
+        self.objects_dir = self.cache_dir / "objects"
+        self.stats_path = self.cache_dir / "stats"
+
+    def object_path(self, key: str) -> Path:
+        return self.objects_dir / key[:2] / key
+
+    def get(self, key: str, destination: Path) -> bool:
+        cached = self.object_path(key)
+        try:
+            copy_file(cached, destination)
+        except OSError:
+            # Not cached, or removed by a prune in another compile since.
+            return False
+
+        # Used to evict the least recently used objects first. atime is not reliable, many systems mount with noatime.
+        try:
+            os.utime(str(cached))
+        except OSError:
+            pass
+        return True
+
+    def put(self, key: str, source: Path):
+        try:
+            copy_file(source, self.object_path(key))
+        except OSError:
+            # For example a full disk. The output has been built, it just is not cached.
+            return
+
+        if random.random() < PruneProbability:
+            try:
+                self.prune()
+            except OSError:
+                pass
+
+    def record(self, event: str):
+        # Appending a short line is atomic, so parallel compiles can record events without locking.
+        try:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            with self.stats_path.open("a") as stats_file:
+                stats_file.write(event + "\n")
+                size = stats_file.tell()
+            if size > MaxStatsSize:
+                self.compact_stats()
+        except OSError:
+            pass
+
+    def read_stats(self) -> Dict[str, int]:
+        # Lines are either an event or, once compacted, an event and its count.
+        counts = {}
+        if self.stats_path.exists():
+            for line in self.stats_path.read_text().splitlines():
+                fields = line.split()
+                if len(fields) == 1:
+                    count = 1
+                elif len(fields) == 2 and fields[1].isdigit():
+                    count = int(fields[1])
+                else:
+                    continue
+                counts[fields[0]] = counts.get(fields[0], 0) + count
+        return counts
+
+    def compact_stats(self):
+        # Events recorded by other compiles while the file is rewritten may be lost. The statistics are only a guide.
+        counts = self.read_stats()
+        content = "".join(f"{event} {count}\n" for event, count in counts.items())
+        temporary = self.stats_path.parent / f".stats.{os.getpid()}.tmp"
+        temporary.write_text(content)
+        os.replace(str(temporary), str(self.stats_path))
+
+    def entries(self) -> List[Tuple[Path, os.stat_result]]:
+        if not self.objects_dir.exists():
+            return []
+
+        entries = []
+        for path in self.objects_dir.glob("*/*"):
+            try:
+                entries.append((path, path.stat()))
+            except FileNotFoundError:
+                # Removed by a concurrent prune.
+                pass
+        return entries
+
+    def stats(self):
+        counts = self.read_stats()
+        entries = self.entries()
+        size = sum(stat.st_size for _, stat in entries)
+        return {
+            "hits": counts.get("hit", 0),
+            "remote_hits": counts.get("remote_hit", 0),
+            "misses": counts.get("miss", 0),
+            "entries": len(entries),
+            "size": size,
+            "max_size": self.max_size,
+        }
+
+    def prune(self, max_size: int = None):
+        max_size = self.max_size if max_size is None else max_size
+        entries = sorted(self.entries(), key=lambda entry: entry[1].st_mtime)
+        size = sum(stat.st_size for _, stat in entries)
+
+        removed = 0
+        for path, stat in entries:
+            if size <= max_size:
+                break
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass
+            size -= stat.st_size
+            removed += 1
+
+        return removed
+
+    def clear(self):
+        if self.cache_dir.exists():
+            shutil.rmtree(str(self.cache_dir))
+
+
+def compiler_identity(compiler: str) -> str:
+    # The resolved path, size and mtime of the compiler change whenever the compiler is upgraded. This is much
+    # cheaper than running `compiler --version` for every translation unit.
+    compiler_path = shutil.which(compiler)
+    if not compiler_path:
+        return compiler
+
+    compiler_path = os.path.realpath(compiler_path)
+    stat = os.stat(compiler_path)
+    return f"{compiler_path}:{stat.st_size}:{stat.st_mtime_ns}"
+
+
+def split_compile_command(command: List[str]):
+    # Returns the output path, the depfile path and the arguments that affect the object file. The output and depfile
+    # paths are excluded from the arguments so the same source, compiled with the same flags for different builds,
+    # shares a cache entry.
+    output = None
+    depfile = None
+    arguments = []
+
+    index = 1
+    while index < len(command):
+        argument = command[index]
+        if argument == "-o" and index + 1 < len(command):
+            output = command[index + 1]
+            index += 2
+        elif argument == "-MF" and index + 1 < len(command):
+            depfile = command[index + 1]
+            index += 2
+        else:
+            arguments.append(argument)
+            index += 1
+
+    return output, depfile, arguments
+
+
+def preprocess_command(command: List[str], output, depfile) -> List[str]:
+    compiler = command[0]
+    _, _, arguments = split_compile_command(command)
+    arguments = ["-E" if argument == "-c" else argument for argument in arguments]
+    if depfile:
+        # The depfile is still needed by ninja and must name the real output.
+        arguments += ["-MF", depfile, "-MT", output]
+    return [compiler] + arguments
+
+
+def compute_key(command: List[str], preprocessed: bytes) -> str:
+    _, _, arguments = split_compile_command(command)
+    hasher = hashlib.sha256()
+    hasher.update(compiler_identity(command[0]).encode("utf-8"))
+    hasher.update(b"\0")
+    hasher.update("\0".join(arguments).encode("utf-8"))
+    hasher.update(b"\0")
+    hasher.update(preprocessed)
+    return hasher.hexdigest()
+
+
+def fetch(key: str, output: Path, cache: CompileCache, remote: CacheBackend):
+    if cache.get(key, output):
+        cache.record("hit")
+        return True
+
+    if remote and remote.get(key, output):
+        cache.put(key, output)
+        cache.record("remote_hit")
+        return True
+
+    cache.record("miss")
+    return False
+
+
+def store(key: str, output: Path, cache: CompileCache, remote: CacheBackend):
+    cache.put(key, output)
+    if remote:
+        remote.put(key, output)
+
+
+def cached_compile(
+    command: List[str], cache: CompileCache = None, remote: CacheBackend = None
+) -> int:
+    cache = cache if cache else CompileCache()
+    output, depfile, _ = split_compile_command(command)
+    if not output or "-gsplit-dwarf" in command:
+        # Nothing can be cached without knowing the output. Split debug information is written to a second output,
+        # the .dwo file, which the cache does not store.
+        return subprocess.run(command).returncode
+
+    preprocessed = subprocess.run(
+        preprocess_command(command, output, depfile), stdout=subprocess.PIPE
+    )
+    if preprocessed.returncode != 0:
+        # Let the real compile report the error.
+        return subprocess.run(command).returncode
+
+    key = compute_key(command, preprocessed.stdout)
+    if fetch(key, Path(output), cache, remote):
+        return 0
+
+    return_code = subprocess.run(command).returncode
+    if return_code == 0:
+        store(key, Path(output), cache, remote)
+    return return_code
+
+
+def hash_file(path: str) -> str:
+    hasher = hashlib.sha256()
+    with open(path, "rb") as the_file:
+        for chunk in iter(lambda: the_file.read(1024 * 1024), b""):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+def find_linked_libraries(arguments: List[str]) -> List[str]:
+    # Libraries passed with -l are not arguments of their own, but the output depends on them. They are found the
+    # same way the linker finds them, in the -L directories.
+    library_dirs = [argument[2:] for argument in arguments if argument.startswith("-L")]
+    libraries = []
+    for argument in arguments:
+        if not argument.startswith("-l"):
+            continue
+
+        name = argument[2:]
+        for library_dir in library_dirs:
+            candidates = [f"lib{name}.so", f"lib{name}.dylib", f"lib{name}.a"]
+            found = [
+                os.path.join(library_dir, candidate)
+                for candidate in candidates
+                if os.path.isfile(os.path.join(library_dir, candidate))
+            ]
+            if found:
+                libraries.append(found[0])
+                break
+
+    return libraries
+
+
+def compute_artifact_key(command: List[str], output: str) -> str:
+    hasher = hashlib.sha256()
+    hasher.update(compiler_identity(command[0]).encode("utf-8"))
+    for argument in command[1:] + find_linked_libraries(command[1:]):
+        hasher.update(b"\0")
+        if argument == output:
+            # The output may exist from a previous build. It is not an input.
+            hasher.update(b"<output>")
+        elif os.path.isfile(argument):
+            hasher.update(hash_file(argument).encode("utf-8"))
+        else:
+            hasher.update(argument.encode("utf-8"))
+    return hasher.hexdigest()
+
+
+def cached_artifact(
+    output: str,
+    command: List[str],
+    cache: CompileCache = None,
+    remote: CacheBackend = None,
+) -> int:
+    cache = cache if cache else CompileCache()
+    key = compute_artifact_key(command, output)
+    if fetch(key, Path(output), cache, remote):
+        # File modes are not stored in the cache. Give the output the mode the linker would have, respecting the umask.
+        umask = os.umask(0)
+        os.umask(umask)
+        os.chmod(output, 0o777 & ~umask)
+        return 0
+
+    return_code = subprocess.run(command).returncode
+    if return_code == 0:
+        store(key, Path(output), cache, remote)
+    return return_code
+
+
+def main(argv: List[str]):
+    usage = (
+        "usage: python -m aim_build.compilecache compile [--remote <location>] <compiler> <args...>\n"
+        "       python -m aim_build.compilecache artifact [--remote <location>] <output> <command> <args...>"
+    )
+    if not argv or argv[0] not in ["compile", "artifact"]:
+        print(usage)
+        return 2
+
+    mode = argv[0]
+    argv = argv[1:]
+
+    remote = None
+    if len(argv) >= 2 and argv[0] == "--remote":
+        remote = make_backend(argv[1], get_cache_dir())
+        argv = argv[2:]
+
+    if mode == "compile" and argv:
+        return cached_compile(argv, remote=remote)
+    if mode == "artifact" and len(argv) >= 2:
+        return cached_artifact(argv[0], argv[1:], remote=remote)
+
+    print(usage)
+    return 2
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
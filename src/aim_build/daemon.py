@@ -0,0 +1,322 @@
+# A long running process that builds a target on request.
+#
+#     aim daemon --target builds/linux
+#
+# Every `aim build` for the target is then forwarded to the daemon over a Unix socket, see `request_build`. The daemon
+# keeps the parsed target.toml, the build graph and the source directory listings in memory and watches the target
+# and the source directories for changes, so a build only pays for starting the client and running ninja.
+#
+# Client and daemon exchange frames: a kind byte, a 4 byte big endian length and a payload. The client sends one
+# request frame, with a json payload, and the daemon answers with output frames followed by an exit frame.
+import contextlib
+import hashlib
+import json
+import os
+import socket
+import struct
+import sys
+import tempfile
+import threading
+from pathlib import Path
+
+FrameHeader = struct.Struct(">cI")
+RequestFrame = b"r"
+StdoutFrame = b"o"
+StderrFrame = b"e"
+ExitFrame = b"x"
+
+
+def get_socket_dir() -> str:
+    # Clients trust whatever answers on the socket, so it is kept where other users can not create files. Failing
+    # that, in a directory of the temporary directory that only the user can access.
+    runtime_dir = os.environ.get("XDG_RUNTIME_DIR", None)
+    if runtime_dir and os.path.isdir(runtime_dir):
+        return runtime_dir
+    return os.path.join(tempfile.gettempdir(), f"aim-{os.getuid()}")
+
+
+def is_private(directory: str) -> bool:
+    # Whether the directory belongs to the user and only the user can add to it.
+    stat = os.stat(directory)
+    return stat.st_uid == os.getuid() and not stat.st_mode & 0o022
+
+
+def get_socket_path(build_dir: Path) -> str:
+    # Socket paths are limited to around 100 characters, too short for many build directories. The socket is named
+    # after a hash of the build directory instead.
+    digest = hashlib.sha1(str(build_dir.resolve()).encode("utf-8")).hexdigest()
+    return os.path.join(get_socket_dir(), f"aim-{digest[:16]}.sock")
+
+
+def send_frame(connection: socket.socket, kind: bytes, payload: bytes):
+    connection.sendall(FrameHeader.pack(kind, len(payload)) + payload)
+
+
+def receive_exactly(connection: socket.socket, size: int) -> bytes:
+    data = b""
+    while len(data) < size:
+        chunk = connection.recv(size - len(data))
+        if not chunk:
+            return b""
+        data += chunk
+    return data
+
+
+def receive_frame(connection: socket.socket):
+    # Returns (None, None) when the other side has closed the connection.
+    header = receive_exactly(connection, FrameHeader.size)
+    if not header:
+        return None, None
+    kind, size = FrameHeader.unpack(header)
+    payload = receive_exactly(connection, size) if size else b""
+    return kind, payload
+
+
+def connect(build_dir: Path):
+    # Returns None when no daemon is running for the target.
+    if not hasattr(socket, "AF_UNIX"):
+        return None
+
+    socket_path = get_socket_path(build_dir)
+    try:
+        if (
+            not is_private(os.path.dirname(socket_path))
+            or os.stat(socket_path).st_uid != os.getuid()
+        ):
+            # Not a daemon of the user's. The build is done without it.
+            return None
+    except OSError:
+        return None
+
+    connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        connection.connect(socket_path)
+    except OSError:
+        connection.close()
+        return None
+    return connection
+
+
+def send_request(connection: socket.socket, request) -> int:
+    # Writes the daemon's output as it arrives and returns the exit code.
+    send_frame(connection, RequestFrame, json.dumps(request).encode("utf-8"))
+    while True:
+        kind, payload = receive_frame(connection)
+        if kind is None:
+            raise RuntimeError("The aim daemon closed the connection during the build.")
+        if kind == ExitFrame:
+            return int(payload)
+
+        destination = sys.stdout.buffer if kind == StdoutFrame else sys.stderr.buffer
+        destination.write(payload)
+        destination.flush()
+
+
+def request_build(build_dir: Path, request):
+    # Returns None when no daemon is running for the target, otherwise the exit code of the build.
+    connection = connect(build_dir)
+    if not connection:
+        return None
+
+    with connection:
+        return send_request(connection, dict(request, command="build"))
+
+
+def stop_daemon(build_dir: Path):
+    connection = connect(build_dir)
+    if not connection:
+        raise RuntimeError(f"No aim daemon is running for {str(build_dir)}.")
+
+    with connection:
+        send_request(connection, {"command": "stop"})
+
+
+class FrameWriter:
+    # Forwards what is written to it to the client as frames of one kind. Ninja's stdout and stderr are forwarded by
+    # different threads, so writes are serialised by a lock shared by the connection's writers.
+    def __init__(self, connection: socket.socket, kind: bytes, lock: threading.Lock):
+        self.connection = connection
+        self.kind = kind
+        self.lock = lock
+        self.closed = False
+
+    def write(self, data):
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        if data and not self.closed:
+            with self.lock:
+                try:
+                    send_frame(self.connection, self.kind, data)
+                except OSError:
+                    # The client went away, for example because the user interrupted the build. The output is
+                    # dropped, ninja must still be drained so it can finish.
+                    self.closed = True
+        return len(data)
+
+    def flush(self):
+        pass
+
+
+class Daemon:
+    def __init__(self, build_dir: Path):
+        from aim_build.srcscanner import SourceCacheFile, SourceScanner
+        from aim_build.watcher import make_watcher
+
+        self.build_dir = build_dir.resolve()
+        self.toml_path = self.build_dir / "target.toml"
+        if not self.toml_path.exists():
+            raise RuntimeError(f"Failed to find {str(self.toml_path)}.")
+
+        self.socket_path = None
+        self.scanner = SourceScanner(self.build_dir / SourceCacheFile)
+        self.watcher = make_watcher()
+        self.parsed_toml = None
+        self.graph = None
+        self.generated = False
+        # target.toml is watched from the start, the source directories once they are known.
+        self.watcher.watch([str(self.build_dir)])
+
+    def is_stale(self, path: str, kind: str) -> bool:
+        # Whether a change means the ninja files have to be generated again. The only file of the target directory
+        # that matters is target.toml, everything else in it is written by aim and ninja. In source directories only
+        # added and removed entries matter, ninja notices edited sources itself.
+        from aim_build.watcher import Modified, is_editor_file
+
+        if os.path.dirname(path) == str(self.build_dir):
+            return path == str(self.toml_path)
+        return kind != Modified and not is_editor_file(path)
+
+    def refresh(self, skip_ninja_regen: bool):
+        import toml
+
+        from aim_build.buildgraph import BuildGraph
+        from aim_build.fingerprint import ninja_files_missing
+        from aim_build.main import generate_target, get_variant_dirs
+
+        changes = self.watcher.poll(0)
+        if any(self.is_stale(path, kind) for path, kind in changes):
+            self.parsed_toml = None
+        elif self.generated and any(
+            ninja_files_missing(variant_dir, self.graph.order)
+            for variant_dir in get_variant_dirs(self.parsed_toml, self.build_dir)
+        ):
+            # Deleted from under the daemon. Ninja can not recover from that by itself. Generation adds the scanned
+            # sources to the builds, so the target is loaded again before it is generated again.
+            self.parsed_toml = None
+
+        if self.parsed_toml is None:
+            parsed_toml = toml.loads(self.toml_path.read_text())
+            self.graph = BuildGraph(parsed_toml["builds"])
+            self.parsed_toml = parsed_toml
+            self.generated = False
+
+        if skip_ninja_regen or self.generated:
+            return
+
+        # Directories that are no longer scanned are dropped from the listings when they are saved.
+        self.scanner.visited = set()
+        # generate_target also updates the mtimes that ninja recorded for the ninja files. Otherwise ninja would run
+        # the generation again, as soon as the build is started.
+        generate_target(self.parsed_toml, self.build_dir, self.scanner)
+        self.generated = True
+
+        # A change made during generation may be missed by the watcher. Ninja still notices it, build.ninja depends on
+        # target.toml and every source directory, and regenerates the ninja files itself.
+        watched = {str(self.build_dir)}
+        for build_info in self.parsed_toml["builds"]:
+            watched.update(str(path) for path in build_info["scanned_dirs"])
+        self.watcher.watch(watched)
+
+    def build(self, request, stdout: FrameWriter, stderr: FrameWriter) -> int:
+        from aim_build.main import find_build_names, get_variant_dir, run_ninja
+
+        try:
+            with contextlib.redirect_stdout(stdout):
+                self.refresh(request.get("skip_ninja_regen", False))
+                build_names = find_build_names(
+                    self.graph, request.get("builds", []), request.get("all", False)
+                )
+                variant_dir = get_variant_dir(
+                    self.parsed_toml, self.build_dir, request.get("variant", None)
+                )
+                return run_ninja(
+                    variant_dir,
+                    build_names,
+                    request.get("log", None),
+                    (stdout, stderr),
+                )
+        except (RuntimeError, ValueError) as e:
+            # An invalid target.toml, build name or variant. The daemon keeps running, the request may be repeated
+            # once the target has been fixed.
+            stdout.write(f"Error: {e.args[0]}\n")
+            return -1
+        except SystemExit as e:
+            # Generation exits when the target is invalid, after printing why.
+            self.parsed_toml = None
+            return e.code if isinstance(e.code, int) else -1
+
+    def handle(self, connection: socket.socket) -> bool:
+        # Returns False when the daemon has been asked to stop.
+        kind, payload = receive_frame(connection)
+        if kind != RequestFrame:
+            return True
+
+        request = json.loads(payload.decode("utf-8"))
+        lock = threading.Lock()
+        stdout = FrameWriter(connection, StdoutFrame, lock)
+        stderr = FrameWriter(connection, StderrFrame, lock)
+
+        if request.get("command") == "stop":
+            stdout.write("Stopping the aim daemon.\n")
+            send_frame(connection, ExitFrame, b"0")
+            return False
+
+        return_code = self.build(request, stdout, stderr)
+        send_frame(connection, ExitFrame, str(return_code).encode("utf-8"))
+        return True
+
+    def serve(self):
+        if not hasattr(socket, "AF_UNIX"):
+            raise RuntimeError("The aim daemon needs Unix domain sockets.")
+
+        self.socket_path = get_socket_path(self.build_dir)
+        socket_dir = os.path.dirname(self.socket_path)
+        os.makedirs(socket_dir, mode=0o700, exist_ok=True)
+        if not is_private(socket_dir):
+            raise RuntimeError(
+                f"{socket_dir} can be written by other users, the aim daemon can not use it."
+            )
+
+        existing = connect(self.build_dir)
+        if existing:
+            existing.close()
+            raise RuntimeError(
+                f"An aim daemon is already running for {str(self.build_dir)}."
+            )
+        if os.path.exists(self.socket_path):
+            # Left behind by a daemon that did not shut down cleanly.
+            os.unlink(self.socket_path)
+
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        server.bind(self.socket_path)
+        os.chmod(self.socket_path, 0o600)
+        server.listen()
+        print(f"Serving builds of {str(self.build_dir)} on {self.socket_path}")
+
+        try:
+            # Requests are served one at a time. Ninja can not run twice in the same directory anyway.
+            running = True
+            while running:
+                connection, _ = server.accept()
+                with connection:
+                    try:
+                        running = self.handle(connection)
+                    except OSError:
+                        # The client went away before the exit frame could be sent.
+                        pass
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.close()
+            os.unlink(self.socket_path)
+            self.watcher.close()
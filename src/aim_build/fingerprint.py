@@ -0,0 +1,97 @@
+import hashlib
+import json
+from pathlib import Path
+from typing import Dict, List
+
+from aim_build.buildgraph import BuildGraph
+from aim_build.version import __version__
+
+FingerprintFile = ".aim_fingerprints"
+
+
+def hash_object(obj) -> str:
+    # Paths and any other non-json types are hashed via their string representation.
+    data = json.dumps(obj, sort_keys=True, default=str)
+    return hashlib.sha1(data.encode("utf-8")).hexdigest()
+
+
+def fingerprint_builds(parsed_toml: Dict, graph: BuildGraph) -> Dict[str, str]:
+    # A build's fingerprint covers the aim version, the global settings, its own settings (including the globbed
+    # source files) and the fingerprints of everything it requires. If a required build changes, so does the build
+    # that depends on it.
+    global_settings = {
+        key: value for key, value in parsed_toml.items() if key != "builds"
+    }
+    global_hash = hash_object([__version__, global_settings])
+
+    # The graph's order guarantees requirements are fingerprinted before the builds that require them.
+    fingerprints = {}
+    for build in graph.sorted_builds():
+        requires = [fingerprints[required] for required in build.get("requires", [])]
+        fingerprints[build["name"]] = hash_object([global_hash, build, requires])
+
+    return fingerprints
+
+
+def load_manifest(build_dir: Path) -> Dict:
+    fingerprint_path = build_dir / FingerprintFile
+    if not fingerprint_path.exists():
+        return {}
+
+    try:
+        manifest = json.loads(fingerprint_path.read_text())
+    except ValueError:
+        # A corrupt file just means everything is regenerated.
+        return {}
+
+    if manifest.get("version") != __version__:
+        return {}
+
+    return manifest
+
+
+def load_fingerprints(build_dir: Path) -> Dict[str, str]:
+    return load_manifest(build_dir).get("builds", {})
+
+
+def load_generated_files(build_dir: Path) -> Dict[str, List[str]]:
+    # The files, other than ninja files, that generation wrote for each build, such as unity files.
+    return load_manifest(build_dir).get("generated", {})
+
+
+def build_files_missing(build_dir: Path, build_name: str, generated_files) -> bool:
+    if build_name not in generated_files:
+        # Generated before the generated files were recorded.
+        return True
+
+    build_path = build_dir / build_name
+    paths = [build_path / "build.ninja", build_path / "compile.ninja"]
+    paths += [Path(path) for path in generated_files[build_name]]
+    return not all(path.exists() for path in paths)
+
+
+def ninja_files_missing(build_dir: Path, build_names: List[str]) -> bool:
+    # Whether the ninja files have to be generated before ninja can be run. Ninja regenerates them itself when they
+    # are out of date, but it has to load every build's ninja file before it can, so it can not recover from one that
+    # has been deleted. Nor can it recreate a unity file or precompiled header that has gone missing.
+    manifest = load_manifest(build_dir)
+    if not manifest.get("builds") or not (build_dir / "build.ninja").exists():
+        return True
+
+    generated_files = manifest.get("generated", {})
+    return any(
+        build_files_missing(build_dir, build_name, generated_files)
+        for build_name in build_names
+    )
+
+
+def save_fingerprints(
+    build_dir: Path, fingerprints: Dict[str, str], generated_files=None
+):
+    manifest = {
+        "version": __version__,
+        "builds": fingerprints,
+        "generated": generated_files if generated_files else {},
+    }
+    fingerprint_path = build_dir / FingerprintFile
+    fingerprint_path.write_text(json.dumps(manifest, indent=4, sort_keys=True))
@@ -1,6 +1,11 @@
+import shlex
+import sys
 import functools
+import json
 from typing import Dict
+from aim_build.buildgraph import BuildGraph
 from aim_build.gccbuildrules import *
+from aim_build.srcscanner import SourceScanner
 from aim_build.utils import *
 
 PrefixIncludePath = functools.partial(prefix, "-I")
@@ -8,22 +13,81 @@ PrefixLibraryPath = functools.partial(prefix, "-L")
 PrefixLibrary = functools.partial(prefix, "-l")
 ToObjectFiles = src_to_o
 
-FileExtensions = ["*.cpp", "*.cc", ".c"]
+CompileCommandsFile = "compile_commands.json"
+# One entry per line rather than a json array, so tools that look for compile_commands.json do not pick it up.
+CompileCommandsFragmentFile = "compile_commands.fragment"
 
+FileExtensions = ["*.cpp", "*.cc", "*.c"]
+DefaultUnityBatchSize = 8
 
-def get_src_files(build):
+# ThinLTO cache pruning. The cache is pruned down to this percentage of the free disk space, and entries that have
+# not been used for this many hours are removed.
+DefaultLtoCacheSize = 10
+DefaultLtoCachePruneAfter = 168
+
+
+def get_src_files(build, scanner: SourceScanner):
     directory = build["directory"]
     srcs = prepend_paths(directory, build["srcDirs"])
     src_dirs = [path for path in srcs if path.is_dir()]
     explicit_src_files = [path for path in srcs if path.is_file()]
+    patterns = build.get("srcPatterns", FileExtensions)
+    excludes = build.get("srcExcludes", [])
+
     src_files = []
-    for glob_pattern in FileExtensions:
-        glob_files = flatten(glob(glob_pattern, src_dirs))
-        src_files += glob_files
+    scanned_dirs = []
+    for src_dir in src_dirs:
+        dir_src_files, dir_scanned_dirs = scanner.scan(
+            src_dir, directory, patterns, excludes
+        )
+        src_files += dir_src_files
+        scanned_dirs += dir_scanned_dirs
 
     src_files += explicit_src_files
     assert src_files, f"Fail to find any source files in {to_str(src_dirs)}."
-    return src_files
+    return src_files, scanned_dirs
+
+
+def write_unity_files(unity_dir: Path, base_path: Path, src_files, batch_size):
+    # Sources are batched per directory, in sorted order, so adding or removing a file only changes the batches of
+    # its own directory. C and C++ sources are never mixed in a batch. A unity file is only rewritten when its
+    # content changes, so only the batches that are affected are recompiled.
+    batches = {}
+    for src_file in sorted(src_files):
+        extension = ".c" if src_file.suffix == ".c" else ".cpp"
+        key = (mirror_path(src_file.parent, base_path), extension)
+        batches.setdefault(key, []).append(src_file)
+
+    unity_files = []
+    for (directory, extension), batch_files in sorted(batches.items()):
+        for index in range(0, len(batch_files), batch_size):
+            batch = batch_files[index : index + batch_size]
+            unity_file = (
+                unity_dir / directory / f"unity_{index // batch_size}{extension}"
+            )
+            content = "".join(f'#include "{str(src_file)}"\n' for src_file in batch)
+            write_if_changed(unity_file, content)
+            unity_files.append(unity_file)
+
+    return unity_files
+
+
+def check_object_clashes(src_files, obj_files):
+    sources_by_object = {}
+    for src_file, obj_file in zip(src_files, obj_files):
+        sources_by_object.setdefault(obj_file, []).append(src_file)
+
+    clashes = {
+        obj_file: srcs for obj_file, srcs in sources_by_object.items() if len(srcs) > 1
+    }
+    if clashes:
+        details = [
+            f"{obj_file} <- {', '.join(to_str(srcs))}"
+            for obj_file, srcs in clashes.items()
+        ]
+        raise RuntimeError(
+            "Multiple source files map to the same object file:\n" + "\n".join(details)
+        )
 
 
 def get_include_paths(build):
@@ -48,25 +112,135 @@ def get_library_information(build):
     return libraries, link_libraries
 
 
-def find_build(build_name, builds):
-    # Note, this should never fail, as required dependencies are checked by the schema.
+def get_cache_launchers(parsed_toml):
+    # A remote cache implies the local compile cache. Archives and linked outputs are only cached when there is a
+    # remote cache, locally they are cheap to rebuild from cached objects.
+    remote_cache = parsed_toml.get("remoteCache", None)
+    if not remote_cache and not parsed_toml.get("compileCache", False):
+        return "", ""
+
+    cache_module = f"{shlex.quote(sys.executable)} -m aim_build.compilecache"
+    if not remote_cache:
+        return f"{cache_module} compile ", ""
+
+    remote = shlex.quote(remote_cache)
+    return (
+        f"{cache_module} compile --remote {remote} ",
+        f"{cache_module} artifact --remote {remote} $out ",
+    )
+
+
+def compile_command_entry(build_dir, compiler, defines, flags, includes, src, obj):
+    # The same command as the compile rule, without the compile cache's launcher, as tools like clangd expect.
+    command = " ".join(
+        part
+        for part in [compiler]
+        + defines
+        + flags
+        + ["-MMD", "-MF", f"{obj}.d"]
+        + includes
+        + ["-c", src, "-o", obj]
+        if part
+    )
+    entry = {"directory": build_dir, "command": command, "file": src, "output": obj}
+    return json.dumps(entry)
+
+
+def write_compile_commands(build_dir: Path, builds) -> bool:
+    # Every build writes its own fragment when it is generated, one entry per line. Fragments are joined without
+    # being parsed, and the result is only written when it changes, so editors do not re-index needlessly.
+    entries = []
     for build in builds:
-        if build["name"] == build_name:
-            return build
+        fragment = build_dir / build["name"] / CompileCommandsFragmentFile
+        if fragment.exists():
+            entries += fragment.read_text().splitlines()
+
+    content = "[\n" + ",\n".join(entries) + "\n]\n" if entries else "[]\n"
+    return write_if_changed(build_dir.resolve() / CompileCommandsFile, content)
+
+
+def get_lto_mode(build):
+    lto = build.get("lto", None)
+    return lto if lto else build.get("global_lto", None)
+
+
+def is_clang(compiler):
+    return "clang" in Path(compiler).name
+
+
+def get_lto_compile_flags(lto, compiler):
+    if not lto:
+        return []
+    if is_clang(compiler):
+        return ["-flto=thin"] if lto == "thin" else ["-flto"]
+    # GCC has no thin mode. Its LTO already partitions the program and optimises the partitions in parallel.
+    return ["-flto=auto"]
+
+
+def get_lto_archiver(archiver, compiler, lto):
+    # Archives of LTO objects need a symbol index built by an archiver that understands the compiler's
+    # intermediate representation.
+    if not lto or Path(archiver).name != "ar":
+        return archiver
+    return "llvm-ar" if is_clang(compiler) else "gcc-ar"
+
+
+def get_lto_cache_settings(build):
+    cache_dir = build["build_dir"].resolve() / "lto_cache"
+    cache_size = build.get("global_lto_cache_size", None)
+    prune_after = build.get("global_lto_cache_prune_after", None)
+    cache_size = cache_size if cache_size else DefaultLtoCacheSize
+    prune_after = prune_after if prune_after else DefaultLtoCachePruneAfter
+    return cache_dir, cache_size, prune_after
+
+
+def get_build_settings(build):
+    # Returns the flags, defines and compiler of a build. A build's own settings replace the target's. A variant's
+    # flags and defines are added to the build's, whether the build has its own or not.
+    local_flags = build.get("flags", None)
+    local_defines = build.get("defines", None)
+    local_compiler = build.get("compiler", None)
+
+    cxxflags = local_flags if local_flags else build["global_flags"]
+    cxxflags = cxxflags + build.get("variant_flags", [])
+    defines = local_defines if local_defines else build["global_defines"]
+    defines = defines + build.get("variant_defines", [])
+    compiler = local_compiler if local_compiler else build["global_compiler"]
+    return cxxflags, defines, compiler
+
+
+def get_pool_variables(build, kind):
+    # kind is "compile" or "link". A build's own pool takes precedence over the target's.
+    pool = build.get(f"{kind}Pool", None)
+    pool = pool if pool else build.get(f"global_{kind}_pool", None)
+    return {"pool": pool} if pool else {}
 
 
 class GCCBuilds:
-    def add_rules(self, build):
-        directory = build["build_dir"]
-        ninja_path = directory / "rules.ninja"
+    def __init__(self, durations: Dict[str, int] = None):
+        # How long each output took to build last time, in milliseconds. When known, the slowest compiles are
+        # written first, see add_compile_rule.
+        self.durations = durations if durations else {}
+
+    def add_rules(self, build_dir, parsed_toml):
+        compile_launcher, artifact_launcher = get_cache_launchers(parsed_toml)
+
+        ninja_path = build_dir / "rules.ninja"
         with ninja_path.open("w+") as ninja_file:
             writer = Writer(ninja_file)
-            add_compile(writer)
-            add_ar(writer)
-            add_exe(writer)
-            add_shared(writer)
-
-    def build(self, build, parsed_toml, project_writer: Writer):
+            add_pools(writer, parsed_toml.get("pools", {}))
+            add_compile(writer, compile_launcher)
+            add_pch(writer)
+            add_ar(writer, artifact_launcher)
+            add_exe(writer, artifact_launcher)
+            add_shared(writer, artifact_launcher)
+            add_regenerate(writer)
+
+    def add_to_project(self, pfw: Writer, build: Dict):
+        build_path = build["build_dir"] / build["name"]
+        pfw.subninja(escape_path(str((build_path / "build.ninja").resolve())))
+
+    def build(self, build, graph: BuildGraph):
         the_build = build["buildRule"]
 
         build_name = build["name"]
@@ -80,94 +254,176 @@ class GCCBuilds:
         ncompile_path = build_path / "compile.ninja"
         build["buildPath"] = build_path
 
-        self.add_rules(build)
-
         with ninja_path.open("w+") as ninja_file:
             with ncompile_path.open("w+") as compile_file:
+                # The rules are not included here. Every build.ninja is a subninja of the project's build.ninja,
+                # which includes the rules once for all builds.
                 ninja_writer = Writer(ninja_file)
                 compile_writer = Writer(compile_file)
-                rule_path = (build_dir / "rules.ninja").resolve()
-                ninja_writer.include(escape_path(str(rule_path)))
-                ninja_writer.newline()
 
                 if the_build == "staticlib":
                     self.build_static_library(
-                        ninja_writer, compile_writer, project_writer, build, parsed_toml
+                        ninja_writer, compile_writer, build, graph
                     )
                 elif the_build == "exe":
-                    self.build_executable(
-                        ninja_writer, compile_writer, project_writer, build, parsed_toml
-                    )
+                    self.build_executable(ninja_writer, compile_writer, build, graph)
                 elif the_build == "dynamiclib":
                     self.build_dynamic_library(
-                        ninja_writer, compile_writer, project_writer, build, parsed_toml
+                        ninja_writer, compile_writer, build, graph
                     )
                 else:
                     raise RuntimeError(f"Unknown build type {the_build}.")
 
-    def add_compile_rule(self, nfw: Writer, build: Dict, parsed_toml):
-        local_flags = build.get("flags", None)
-        local_defines = build.get("defines", None)
-        local_compiler = build.get("compiler", None)
-
-        cxxflags = local_flags if local_flags else build["global_flags"]
-        defines = local_defines if local_defines else build["global_defines"]
-        compiler = local_compiler if local_compiler else build["global_compiler"]
+    def add_compile_rule(self, nfw: Writer, build: Dict, graph: BuildGraph):
+        cxxflags, defines, compiler = get_build_settings(build)
+        cxxflags = cxxflags + get_lto_compile_flags(get_lto_mode(build), compiler)
+        if build.get("global_split_dwarf", False):
+            # Debug information goes into a .dwo file next to each object, so the linker does not have to process it.
+            cxxflags = cxxflags + ["-gsplit-dwarf"]
 
-        src_files = get_src_files(build)
+        # A source file can be found twice, for example when it is listed explicitly and its directory is also a
+        # source directory. It must still only be compiled once.
+        src_files = list(dict.fromkeys(build["src_files"]))
         includes = get_include_paths(build)
-        includes += self.get_required_include_information(build, parsed_toml)
+        includes += self.get_required_include_information(build, graph)
 
         # Its very important to specify the absolute path to the obj files.
         # This prevents recompilation of files when an exe links against a library.
         # Without the absolute path to the obj files, it would build the files again
         # in the current (exe's) build location.
+        #
+        # The object files mirror the layout of the source files relative to the project directory, so a/util.cpp
+        # and b/util.cpp do not overwrite each other.
         build_path = build["buildPath"]
-        obj_files = ToObjectFiles(src_files)
+        src_base_path = build["directory"]
+        original_src_files = src_files
+        # Files that are not ninja files but are written by generation, and so can only be recreated by generation.
+        build["generated_files"] = []
+        if build.get("unity", False):
+            batch_size = build.get("unityBatchSize", DefaultUnityBatchSize)
+            src_files = write_unity_files(
+                build_path / "unity", src_base_path, src_files, batch_size
+            )
+            src_base_path = build_path
+            build["generated_files"] += to_str(src_files)
+
+        obj_files = ToObjectFiles(src_files, src_base_path)
         obj_files = prepend_paths(build_path, obj_files)
+        check_object_clashes(src_files, obj_files)
+
+        pch_files = []
+        if build.get("precompiledHeader", None):
+            pch_file, pch_flags = self.add_precompiled_header(
+                nfw, build, compiler, includes, cxxflags, defines
+            )
+            pch_files = [pch_file]
+            cxxflags = pch_flags + cxxflags
+
+        file_pairs = list(zip(to_str(src_files), to_str(obj_files)))
+        # The compilation database is written in source order. The scheduling order changes with every build's
+        # timings, and a rewritten database makes editors index the project again.
+        command_pairs = file_pairs
+        if self.durations:
+            # Ninja starts ready edges roughly in the order they were written. Starting the slowest compiles first
+            # keeps them from becoming the tail of the build. Files that have never been built are assumed slow.
+            file_pairs = sorted(
+                file_pairs,
+                key=lambda pair: self.durations.get(pair[1], float("inf")),
+                reverse=True,
+            )
 
-        file_pairs = zip(to_str(src_files), to_str(obj_files))
+        pool_variables = get_pool_variables(build, "compile")
         for src_file, obj_file in file_pairs:
             nfw.build(
                 outputs=obj_file,
                 rule="compile",
                 inputs=src_file,
+                implicit=pch_files,
                 variables={
                     "compiler": compiler,
                     "includes": includes,
                     "flags": cxxflags,
                     "defines": defines,
+                    **pool_variables,
                 },
             )
             nfw.newline()
 
+        # Unity files are an implementation detail. Editors need the commands for the sources themselves.
+        if build.get("unity", False):
+            command_pairs = zip(
+                to_str(original_src_files),
+                to_str(
+                    prepend_paths(
+                        build_path,
+                        ToObjectFiles(original_src_files, build["directory"]),
+                    )
+                ),
+            )
+
+        build_dir = str(build["build_dir"].resolve())
+        entries = [
+            compile_command_entry(
+                build_dir, compiler, defines, cxxflags, includes, src_file, obj_file
+            )
+            for src_file, obj_file in command_pairs
+        ]
+        write_if_changed(
+            build_path / CompileCommandsFragmentFile, "\n".join(entries) + "\n"
+        )
+
         return obj_files
 
+    def add_precompiled_header(
+        self, nfw: Writer, build: Dict, compiler, includes, cxxflags, defines
+    ):
+        # The compiler looks for a precompiled header next to the file named by -include. A forwarding header is
+        # written next to the precompiled header, so the build still works (more slowly) if the precompiled header
+        # can not be used, for example because it was built with different flags.
+        header = (build["directory"] / build["precompiledHeader"]).resolve()
+        pch_dir = build["buildPath"] / "pch"
+        forwarding_header = pch_dir / header.name
+        write_if_changed(forwarding_header, f'#include "{str(header)}"\n')
+        build["generated_files"].append(str(forwarding_header))
+
+        pch_name = self.add_precompiled_header_naming_convention(header.name, compiler)
+        pch_file = str(pch_dir / pch_name)
+        nfw.build(
+            outputs=pch_file,
+            rule="pch",
+            inputs=str(header),
+            variables={
+                "compiler": compiler,
+                "includes": includes,
+                "flags": cxxflags,
+                "defines": defines,
+                **get_pool_variables(build, "compile"),
+            },
+        )
+        nfw.newline()
+
+        return pch_file, ["-include", str(forwarding_header)]
+
     def build_static_library(
-        self, nfw: Writer, cfw: Writer, pfw: Writer, build: Dict, parsed_toml: Dict
+        self, nfw: Writer, cfw: Writer, build: Dict, graph: BuildGraph
     ):
         build_name = build["name"]
         library_name = self.add_static_library_naming_convention(build["outputName"])
 
-        local_flags = build.get("flags", None)
-        local_defines = build.get("defines", None)
+        cxxflags, defines, compiler = get_build_settings(build)
         local_archiver = build.get("archiver", None)
-
-        cxxflags = local_flags if local_flags else build["global_flags"]
-        defines = local_defines if local_defines else build["global_defines"]
         archiver = local_archiver if local_archiver else build["global_archiver"]
+        archiver = self.get_lto_archiver(archiver, compiler, get_lto_mode(build))
 
         build_path = build["buildPath"]
 
         includes = get_include_paths(build)
-        includes += self.get_required_include_information(build, parsed_toml)
+        includes += self.get_required_include_information(build, graph)
 
-        obj_files = self.add_compile_rule(cfw, build, parsed_toml)
+        obj_files = self.add_compile_rule(cfw, build, graph)
 
         relative_output_name = str(build_path / library_name)
 
-        pfw.subninja(str((Path(build_path) / "build.ninja").resolve()))
-
         nfw.build(
             outputs=relative_output_name,
             rule="archive",
@@ -187,24 +443,17 @@ class GCCBuilds:
         nfw.newline()
 
     def build_executable(
-        self, nfw: Writer, cfw: Writer, pfw: Writer, build: Dict, parsed_toml: Dict
+        self, nfw: Writer, cfw: Writer, build: Dict, graph: BuildGraph
     ):
         build_name = build["name"]
         exe_name = self.add_exe_naming_convention(build["outputName"])
 
-        local_flags = build.get("flags", None)
-        local_defines = build.get("defines", None)
-        local_compiler = build.get("compiler", None)
+        cxxflags, defines, compiler = get_build_settings(build)
 
-        cxxflags = local_flags if local_flags else build["global_flags"]
-        defines = local_defines if local_defines else build["global_defines"]
-        compiler = local_compiler if local_compiler else build["global_compiler"]
-
-        requires = build.get("requires", [])
         build_path = build["buildPath"]
 
         includes = get_include_paths(build)
-        includes += self.get_required_include_information(build, parsed_toml)
+        includes += self.get_required_include_information(build, graph)
 
         library_paths = get_library_paths(build)
         (
@@ -212,44 +461,31 @@ class GCCBuilds:
             requires_link_libraries,
             requires_library_paths,
             requires_library_types,
-        ) = self.get_required_library_information(build, parsed_toml)
+        ) = self.get_required_library_information(build, graph)
         libraries, link_libraries = get_library_information(build)
 
-        rpath = self.get_rpath(build, parsed_toml)
+        rpath = self.get_rpath(build, graph)
         linker_args = (
             [rpath]
             + requires_library_paths
             + requires_link_libraries
             + library_paths
             + link_libraries
+            + self.get_lto_link_flags(build, compiler)
+            + self.get_linker_flags(build, compiler)
         )
 
-        for requirement in requires:
-            ninja_file = (build_path.parent / requirement / "build.ninja").resolve()
-            assert ninja_file.exists(), f"Failed to find {str(ninja_file)}."
-            nfw.subninja(escape_path(str(ninja_file)))
-            nfw.newline()
-
-        obj_files = self.add_compile_rule(cfw, build, parsed_toml)
-
-        # Here we just need to manage the fact that the linker's library flag (-l) needs the library name without
-        # lib .a/.so but the build dependency rule does need the full convention to find the build rule in the library's
-        # build.ninja file.
-        full_library_names = []
-        for name, build_type in zip(requires_libraries, requires_library_types):
-            if build_type == "staticlib":
-                full_library_names.append(
-                    self.add_static_library_naming_convention(name)
-                )
-            else:
-                full_library_names.append(
-                    self.add_dynamic_library_naming_convention(name)
-                )
+        obj_files = self.add_compile_rule(cfw, build, graph)
 
-        pfw.include(str((Path(build_path) / "compile.ninja").resolve()))
+        full_library_names = self.get_full_library_names(
+            requires_libraries, requires_library_types
+        )
 
+        # Ninja runs from the target's build directory, so the executable needs the absolute path to end up in its
+        # own build path.
+        relative_output_name = str(build_path / exe_name)
         nfw.build(
-            outputs=exe_name,
+            outputs=relative_output_name,
             rule="exe",
             inputs=to_str(obj_files),
             implicit=full_library_names,
@@ -258,34 +494,29 @@ class GCCBuilds:
                 "includes": includes,
                 "flags": cxxflags,
                 "defines": defines,
-                # TODO: what does exe_name do?
-                "exe_name": exe_name,
+                "exe_name": relative_output_name,
                 "linker_args": " ".join(linker_args),
+                **get_pool_variables(build, "link"),
             },
         )
         nfw.newline()
         nfw.include(str((build_path / "compile.ninja").resolve()))
 
         nfw.newline()
+        nfw.build(rule="phony", inputs=relative_output_name, outputs=exe_name)
         nfw.build(rule="phony", inputs=exe_name, outputs=build_name)
         nfw.newline()
 
     def build_dynamic_library(
-        self, nfw: Writer, cfw: Writer, pfw: Writer, build: Dict, parsed_toml: Dict
+        self, nfw: Writer, cfw: Writer, build: Dict, graph: BuildGraph
     ):
         build_name = build["name"]
         library_name = self.add_dynamic_library_naming_convention(build["outputName"])
 
-        local_flags = build.get("flags", None)
-        local_defines = build.get("defines", None)
-        local_compiler = build.get("compiler", None)
-
-        cxxflags = local_flags if local_flags else build["global_flags"]
-        defines = local_defines if local_defines else build["global_defines"]
-        compiler = local_compiler if local_compiler else build["global_compiler"]
+        cxxflags, defines, compiler = get_build_settings(build)
 
         includes = get_include_paths(build)
-        includes += self.get_required_include_information(build, parsed_toml)
+        includes += self.get_required_include_information(build, graph)
 
         library_paths = get_library_paths(build)
 
@@ -294,27 +525,33 @@ class GCCBuilds:
             requires_link_libraries,
             requires_library_paths,
             requires_library_types,
-        ) = self.get_required_library_information(build, parsed_toml)
+        ) = self.get_required_library_information(build, graph)
         libraries, link_libraries = get_library_information(build)
 
+        rpath = self.get_rpath(build, graph)
         linker_args = (
-            requires_link_libraries
+            [rpath]
+            + requires_link_libraries
             + requires_library_paths
             + library_paths
             + link_libraries
+            + self.get_lto_link_flags(build, compiler)
+            + self.get_linker_flags(build, compiler)
         )
 
-        obj_files = self.add_compile_rule(cfw, build, parsed_toml)
+        obj_files = self.add_compile_rule(cfw, build, graph)
 
-        build_path = build["buildPath"]
+        full_library_names = self.get_full_library_names(
+            requires_libraries, requires_library_types
+        )
 
-        pfw.subninja(str((Path(build_path) / "build.ninja").resolve()))
+        build_path = build["buildPath"]
 
         relative_output_name = str(build_path / library_name)
         nfw.build(
             rule="shared",
             inputs=to_str(obj_files),
-            implicit=requires_libraries,
+            implicit=full_library_names,
             outputs=relative_output_name,
             variables={
                 "compiler": compiler,
@@ -323,6 +560,7 @@ class GCCBuilds:
                 "defines": " ".join(defines),
                 "lib_name": library_name,
                 "linker_args": " ".join(linker_args),
+                **get_pool_variables(build, "link"),
             },
         )
         nfw.newline()
@@ -332,16 +570,15 @@ class GCCBuilds:
         nfw.build(rule="phony", inputs=library_name, outputs=build_name)
         nfw.newline()
 
-    def get_required_library_information(self, build, parsed_toml):
-        requires = build.get("requires", [])
-        if not requires:
+    def get_required_library_information(self, build, graph: BuildGraph):
+        link_requires = graph.link_requires(build["name"])
+        if not link_requires:
             return [], [], [], []
 
         library_names = []
         library_paths = []
         library_types = []
-        for required in requires:
-            the_dep = find_build(required, parsed_toml["builds"])
+        for the_dep in link_requires:
             library_types.append(the_dep["buildRule"])
             library_names.append(the_dep["outputName"])
             dep_name = the_dep["name"]
@@ -351,29 +588,84 @@ class GCCBuilds:
         library_paths = PrefixLibraryPath(library_paths)
         return library_names, PrefixLibrary(library_names), library_paths, library_types
 
-    def get_required_include_information(self, build, parsed_toml):
-        requires = build.get("requires", [])
-        if not requires:
+    def get_full_library_names(self, library_names, library_types):
+        # Here we just need to manage the fact that the linker's library flag (-l) needs the library name without
+        # lib .a/.so but the build dependency rule does need the full convention to find the build rule in the library's
+        # build.ninja file.
+        full_library_names = []
+        for name, build_type in zip(library_names, library_types):
+            if build_type == "staticlib":
+                full_library_names.append(
+                    self.add_static_library_naming_convention(name)
+                )
+            else:
+                full_library_names.append(
+                    self.add_dynamic_library_naming_convention(name)
+                )
+
+        return full_library_names
+
+    def get_required_include_information(self, build, graph: BuildGraph):
+        # Headers of a requirement can include the headers of its own requirements, so the include paths of all
+        # transitive requirements are needed. Each path is only passed once, and the paths of a requirement come
+        # before the paths of the builds it requires.
+        transitive_requires = graph.transitive_requires(build["name"])[::-1]
+        if not transitive_requires:
             return []
 
+        directory = build["directory"]
+        own_include_paths = set(get_include_paths(build))
         include_paths = []
-        for required in requires:
-            the_dep = find_build(required, parsed_toml["builds"])
-            directory = build["directory"]
+        for the_dep in transitive_requires:
             includes = the_dep.get("includePaths", [])
             includes = prepend_paths(directory, includes)
             include_paths += includes
 
-        return PrefixIncludePath(include_paths)
+        include_paths = PrefixIncludePath(include_paths)
+        return [
+            include_path
+            for include_path in dict.fromkeys(include_paths)
+            if include_path not in own_include_paths
+        ]
+
+    def get_lto_archiver(self, archiver, compiler, lto):
+        return get_lto_archiver(archiver, compiler, lto)
+
+    def get_lto_link_flags(self, build: Dict, compiler):
+        lto = get_lto_mode(build)
+        link_flags = get_lto_compile_flags(lto, compiler)
+        if lto != "thin" or not is_clang(compiler):
+            return link_flags
+        if build.get("global_linker", "lld") not in [None, "lld"]:
+            return link_flags
+
+        # Only lld supports ThinLTO's incremental cache, which keeps relinking fast after small changes. See
+        # get_linker_flags.
+        cache_dir, cache_size, prune_after = get_lto_cache_settings(build)
+        return link_flags + [
+            f"-Wl,--thinlto-cache-dir={str(cache_dir)}",
+            f"-Wl,--thinlto-cache-policy=cache_size={cache_size}%:prune_after={prune_after}h",
+        ]
 
-    def get_rpath(self, build: Dict, parsed_toml: Dict):
+    def get_linker_flags(self, build: Dict, compiler):
+        linker = build.get("global_linker", None)
+        if not linker and get_lto_mode(build) == "thin" and is_clang(compiler):
+            linker = "lld"
+
+        linker_flags = [f"-fuse-ld={linker}"] if linker else []
+        if build.get("global_gdb_index", False):
+            # The index is built at link time, so the debugger does not have to build it every time it starts.
+            linker_flags.append("-Wl,--gdb-index")
+        return linker_flags
+
+    def get_rpath(self, build: Dict, graph: BuildGraph):
         # Good blog post about rpath:
         # https://medium.com/@nehckl0/creating-relocatable-linux-executables-by-setting-rpath-with-origin-45de573a2e98
-        requires = build.get("requires", [])
+        # Dynamic libraries required by other dynamic libraries are included too, so they are found both at link time
+        # and at runtime.
         library_paths = []
 
-        for required in requires:
-            the_dep = find_build(required, parsed_toml["builds"])
+        for the_dep in graph.transitive_requires(build["name"]):
             if the_dep["buildRule"] == "dynamiclib":
                 library_paths.append(the_dep["name"])
 
@@ -410,6 +702,12 @@ class GCCBuilds:
     def add_exe_naming_convention(self, exe_name):
         return f"{exe_name}.exe"
 
+    def add_precompiled_header_naming_convention(self, header_name, compiler):
+        # GCC only looks for .gch files. Clang looks for .pch files when a header is included with -include.
+        if "clang" in Path(compiler).name:
+            return f"{header_name}.pch"
+        return f"{header_name}.gch"
+
 
 def log_build_information(build):
     build_name = build["name"]
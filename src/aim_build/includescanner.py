@@ -0,0 +1,171 @@
+import os
+import re
+import subprocess
+from pathlib import Path
+from typing import Dict, List
+
+from aim_build.buildgraph import BuildGraph
+from aim_build.ninjalog import find_build_name, previous_durations
+
+IncludePattern = re.compile(rb'^[ \t]*#[ \t]*include[ \t]*([<"])([^">\n]+)[">]', re.M)
+
+SourceSuffixes = [".cpp", ".cc", ".c"]
+
+
+class IncludeScanner:
+    """Finds the headers a file includes by reading its #include directives.
+
+    Conditional compilation is ignored, so a header included under an #if that is never true is still reported. Only
+    headers that can be found in the including file's directory or the include paths are followed.
+    """
+
+    def __init__(self):
+        self.directives = {}
+        self.resolved = {}
+
+    def read_directives(self, path: str):
+        if path not in self.directives:
+            try:
+                with open(path, "rb") as the_file:
+                    content = the_file.read()
+            except OSError:
+                content = b""
+            self.directives[path] = [
+                (kind == b'"', name.decode("utf-8", "replace").strip())
+                for kind, name in IncludePattern.findall(content)
+            ]
+        return self.directives[path]
+
+    def includes(self, path: str, include_dirs: List[str]) -> List[str]:
+        key = (path, tuple(include_dirs))
+        if key in self.resolved:
+            return self.resolved[key]
+
+        includes = []
+        for quoted, name in self.read_directives(path):
+            # Quoted includes are looked up next to the including file first.
+            search_dirs = [os.path.dirname(path)] if quoted else []
+            for directory in search_dirs + include_dirs:
+                candidate = os.path.normpath(os.path.join(directory, name))
+                if os.path.isfile(candidate):
+                    includes.append(candidate)
+                    break
+
+        self.resolved[key] = includes
+        return includes
+
+    def depths(self, src_file: str, include_dirs: List[str]) -> Dict[str, int]:
+        # The shortest chain of includes from the source file to each header it includes, directly or not.
+        depths = {}
+        current = [src_file]
+        depth = 0
+        while current:
+            depth += 1
+            following = []
+            for path in current:
+                for include in self.includes(path, include_dirs):
+                    if include not in depths and include != src_file:
+                        depths[include] = depth
+                        following.append(include)
+            current = following
+        return depths
+
+
+def read_ninja_deps(build_dir: Path) -> Dict[str, List[str]]:
+    # The dependencies ninja recorded from the compilers' depfiles, per object file. These are exact but only exist
+    # for objects that have been built.
+    result = subprocess.run(
+        ["ninja", "-C", str(build_dir), "-t", "deps"],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL,
+    )
+    if result.returncode != 0:
+        return {}
+
+    deps = {}
+    current = None
+    for line in result.stdout.decode("utf-8", "replace").splitlines():
+        if not line.strip():
+            current = None
+        elif line[0].isspace():
+            if current is not None:
+                deps[current].append(os.path.normpath(line.strip()))
+        elif ": #deps" in line:
+            current = line.split(": #deps")[0]
+            deps[current] = []
+    return deps
+
+
+def is_project_header(path: str, project_dir: str) -> bool:
+    if Path(path).suffix in SourceSuffixes:
+        return False
+    return path.startswith(project_dir + os.sep)
+
+
+def dependency_report(
+    build_dir: Path,
+    project_dir: Path,
+    graph: BuildGraph,
+    src_files: Dict[str, List[Path]],
+    include_dirs: Dict[str, List[str]],
+    top: int = 10,
+) -> Dict:
+    # For every build, the project headers that the most object files depend on. Touching a header rebuilds every
+    # object that depends on it, so its rebuild cost is the sum of those objects' compile times in the last build.
+    build_dir = build_dir.resolve()
+    project_dir = str(project_dir)
+    durations = previous_durations(build_dir)
+    ninja_deps = read_ninja_deps(build_dir)
+
+    dependants = {name: {} for name in graph.order}
+    for obj_file, deps in ninja_deps.items():
+        build_name = find_build_name(obj_file, str(build_dir), graph)
+        if build_name not in dependants:
+            continue
+        for dep in deps:
+            if is_project_header(dep, project_dir):
+                dependants[build_name].setdefault(dep, set()).add(obj_file)
+
+    scanner = IncludeScanner()
+    report = {}
+    for name in graph.order:
+        build_dependants = dependants[name]
+        from_ninja = bool(build_dependants)
+
+        # Include depth can only be found by scanning. Builds that have not been built yet are scanned for their
+        # dependants too, they just have no compile times.
+        header_depths = {}
+        max_depth = 0
+        for src_file in src_files[name]:
+            depths = scanner.depths(str(src_file), include_dirs[name])
+            for header, depth in depths.items():
+                if not is_project_header(header, project_dir):
+                    continue
+                header_depths[header] = min(depth, header_depths.get(header, depth))
+                max_depth = max(max_depth, depth)
+                if not from_ninja:
+                    build_dependants.setdefault(header, set()).add(str(src_file))
+
+        headers = []
+        for header, obj_files in build_dependants.items():
+            headers.append(
+                {
+                    "header": header,
+                    "dependants": len(obj_files),
+                    "depth": header_depths.get(header, None),
+                    "rebuild_ms": sum(durations.get(obj, 0) for obj in obj_files),
+                }
+            )
+        headers.sort(
+            key=lambda header: (header["rebuild_ms"], header["dependants"]),
+            reverse=True,
+        )
+
+        report[name] = {
+            "source": "ninja" if from_ninja else "scan",
+            "translation_units": len(src_files[name]),
+            "max_include_depth": max_depth,
+            "headers": headers[:top],
+        }
+
+    return report
@@ -1,74 +1,332 @@
 import argparse
+import functools
+import json
+import shlex
 import subprocess
 import sys
-
-import toml
-
-from aim_build import gccbuilds
-from aim_build import msvcbuilds
-from aim_build import osxbuilds
-from aim_build.schema import target_schema
+import threading
+
+from aim_build.buildgraph import BuildGraph
+from aim_build.fingerprint import (
+    build_files_missing,
+    fingerprint_builds,
+    load_fingerprints,
+    load_generated_files,
+    ninja_files_missing,
+    save_fingerprints,
+)
 from aim_build.utils import *
 from aim_build.version import __version__
 
+# Aim is started for every build, often by an editor on every save, so its startup time matters. Modules that only
+# some commands need (the builders, the schema, the compile cache and the reports) are imported by those commands.
 
-def find_build(build_name, builds):
-    for build in builds:
-        if build["name"] == build_name:
-            return build
-    else:
-        raise RuntimeError(f"Failed to find build with name: {build_name}")
+
+def forward_stream(source, destination, log_file=None, log_lock=None):
+    # Bytes are passed straight through as soon as they are available. Ninja's output is never decoded.
+    for chunk in iter(functools.partial(os.read, source.fileno(), 65536), b""):
+        destination.write(chunk)
+        destination.flush()
+        if log_file:
+            with log_lock:
+                log_file.write(chunk)
+    source.close()
 
 
-def run_ninja(working_dir, build_name):
-    command = ["ninja", "-v", f"-C{build_name}", build_name]
+def run_ninja(working_dir, build_names, log_path=None, destinations=None):
+    # All builds are built by one ninja, so its scheduler can run the steps of different builds in parallel.
+    command = ["ninja", "-v", f"-C{str(working_dir)}"] + build_names
     command_str = " ".join(command)
-    print(f'Executing "{command_str}"')
+    print(f'Executing "{command_str}"', flush=True)
 
-    process = subprocess.Popen(
-        command, cwd=str(working_dir), stdout=subprocess.PIPE, stderr=subprocess.PIPE
+    process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+
+    log_file = open(str(log_path), "wb") if log_path else None
+    log_lock = threading.Lock()
+
+    # Both pipes are drained at the same time. Draining them one after the other deadlocks as soon as ninja fills
+    # the buffer of the pipe that is not being read.
+    stdout, stderr = (
+        destinations if destinations else (sys.stdout.buffer, sys.stderr.buffer)
     )
+    streams = [(process.stdout, stdout), (process.stderr, stderr)]
+    threads = [
+        threading.Thread(
+            target=forward_stream, args=(source, destination, log_file, log_lock)
+        )
+        for source, destination in streams
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
 
-    for line in iter(process.stdout.readline, b""):
-        sys.stdout.write(line.decode("utf-8"))
-    for line in iter(process.stderr.readline, b""):
-        sys.stderr.write(line.decode("utf-8"))
+    if log_file:
+        log_file.close()
 
+    return process.wait()
+
+
+# Variant settings that are added to the target's settings rather than replacing them.
+VariantListSettings = ["flags", "defines"]
+
+
+def run_ninja_generation(parsed_toml, project_dir: Path, build_dir: Path, scanner=None):
+    from concurrent.futures import ThreadPoolExecutor
+
+    from aim_build import gccbuilds
+    from aim_build.srcscanner import SourceCacheFile, SourceScanner
+
+    builds = parsed_toml["builds"]
+    graph = BuildGraph(builds)
+
+    for build_info in builds:
+        build_info["directory"] = project_dir
+
+    # Builds are independent of each other during generation. Every build.ninja is a subninja of the project's
+    # build.ninja, so no build needs another build's files to exist. Only the project build.ninja, which is
+    # assembled at the end, depends on all of them.
+    with ThreadPoolExecutor() as executor:
+        # Sources are scanned once, however many variants there are. The daemon passes in a scanner that it keeps
+        # between generations.
+        if not scanner:
+            scanner = SourceScanner(build_dir / SourceCacheFile)
+        scan_results = executor.map(
+            lambda build_info: gccbuilds.get_src_files(build_info, scanner), builds
+        )
+        for build_info, (src_files, scanned_dirs) in zip(builds, scan_results):
+            build_info["src_files"] = src_files
+            build_info["scanned_dirs"] = scanned_dirs
+
+        scanner.save()
+
+        variants = parsed_toml.get("variants", None)
+        if not variants:
+            return generate_variant(
+                parsed_toml, {}, graph, build_dir, build_dir, executor
+            )
+
+        # Every variant is generated into its own directory, with its own ninja files, from one pass over the target.
+        generated = False
+        for variant_name, variant in variants.items():
+            variant_toml = {
+                key: value
+                for key, value in parsed_toml.items()
+                if key not in ["variants", "defaultVariant"]
+            }
+            variant_toml.update(
+                {
+                    key: value
+                    for key, value in variant.items()
+                    if key not in VariantListSettings
+                }
+            )
+            print(f"Generating variant {variant_name}")
+            variant_generated = generate_variant(
+                variant_toml,
+                variant,
+                graph,
+                build_dir / variant_name,
+                build_dir,
+                executor,
+            )
+            generated = generated or variant_generated
+
+        # Editors look for compile_commands.json in the target directory, so the default variant's is copied there.
+        default_variant_dir = get_variant_dir(parsed_toml, build_dir)
+        write_if_changed(
+            build_dir / gccbuilds.CompileCommandsFile,
+            (default_variant_dir / gccbuilds.CompileCommandsFile).read_text(),
+        )
+        return generated
+
+
+def generate_variant(
+    parsed_toml,
+    variant,
+    graph: BuildGraph,
+    build_dir: Path,
+    target_dir: Path,
+    executor,
+):
+    from aim_build import gccbuilds
+    from aim_build import osxbuilds
+    from aim_build.ninjalog import build_priorities, previous_durations
 
-def run_ninja_generation(parsed_toml, project_dir: Path, build_dir: Path):
     compiler = parsed_toml["compiler"]
     archiver = parsed_toml["ar"]
     frontend = parsed_toml["compilerFrontend"]
 
     flags = parsed_toml.get("flags", [])
     defines = parsed_toml.get("defines", [])
-    builds = parsed_toml["builds"]
+
+    build_dir.mkdir(parents=True, exist_ok=True)
+
+    # Scheduling hints order the generated edges using the durations from the previous build.
+    durations = {}
+    if parsed_toml.get("schedulingHints", False):
+        durations = previous_durations(build_dir)
+
+    if frontend == "msvc":
+        # builder = msvcbuilds.MSVCBuilds(compiler, compiler_c, archiver)
+        assert False, "MSVC frontend is currently not supported."
+    elif frontend == "osx":
+        builder = osxbuilds.OsxBuilds(durations)
+    else:
+        builder = gccbuilds.GCCBuilds(durations)
+
+    # Each variant gets its own copy of the builds, the scanned sources are shared.
+    builds = [dict(build_info) for build_info in parsed_toml["builds"]]
+    graph = graph.rebind(builds)
+
+    for build_info in builds:
+        build_info["build_dir"] = build_dir
+        build_info["global_flags"] = flags
+        build_info["global_defines"] = defines
+        build_info["variant_flags"] = variant.get("flags", [])
+        build_info["variant_defines"] = variant.get("defines", [])
+        build_info["global_compiler"] = compiler
+        build_info["global_archiver"] = archiver
+        build_info["global_compile_pool"] = parsed_toml.get("compilePool", None)
+        build_info["global_link_pool"] = parsed_toml.get("linkPool", None)
+        build_info["global_lto"] = parsed_toml.get("lto", None)
+        build_info["global_split_dwarf"] = parsed_toml.get("splitDwarf", False)
+        build_info["global_linker"] = parsed_toml.get("linker", None)
+        build_info["global_gdb_index"] = parsed_toml.get("gdbIndex", False)
+        build_info["global_lto_cache_size"] = parsed_toml.get("ltoCacheSize", None)
+        build_info["global_lto_cache_prune_after"] = parsed_toml.get(
+            "ltoCachePruneAfter", None
+        )
+
+    # Only the builds whose fingerprint has changed, or whose ninja files or generated sources have gone missing, are
+    # regenerated.
+    fingerprints = fingerprint_builds(parsed_toml, graph)
+    previous_fingerprints = load_fingerprints(build_dir)
+    generated_files = load_generated_files(build_dir)
+
+    stale_builds = set()
+    for build_info in builds:
+        build_name = build_info["name"]
+        changed = previous_fingerprints.get(build_name) != fingerprints[build_name]
+        if changed or build_files_missing(build_dir, build_name, generated_files):
+            stale_builds.add(build_name)
 
     project_ninja = build_dir / "build.ninja"
+    if not stale_builds and project_ninja.exists():
+        if not (build_dir / gccbuilds.CompileCommandsFile).exists():
+            gccbuilds.write_compile_commands(build_dir, builds)
+        # Ninja invokes `aim generate` when an input of build.ninja is newer than build.ninja, so it must be updated
+        # even when none of its content has changed. With variants, this has to be done for every variant, whether
+        # or not any other variant was regenerated. The mtime that ninja recorded is updated in generate_target.
+        project_ninja.touch()
+        print("Ninja files are up to date.")
+        return False
+
+    # The stale builds are forgotten until they have been generated, so a generation that fails part way through
+    # leaves them stale, rather than up to date with half written ninja files.
+    save_fingerprints(
+        build_dir,
+        {
+            name: fingerprint
+            for name, fingerprint in previous_fingerprints.items()
+            if name not in stale_builds
+        },
+        {
+            name: files
+            for name, files in generated_files.items()
+            if name not in stale_builds
+        },
+    )
+
+    builder.add_rules(build_dir, parsed_toml)
+
+    # Printed here rather than by the worker threads, whose output would be interleaved.
+    stale_build_infos = [
+        build_info for build_info in builds if build_info["name"] in stale_builds
+    ]
+    for build_info in stale_build_infos:
+        print(f'Generating ninja file for {build_info["name"]}')
+
+    # Consuming the results re-raises any exception from the worker threads.
+    list(
+        executor.map(
+            lambda build_info: builder.build(build_info, graph), stale_build_infos
+        )
+    )
+
     with project_ninja.open("w+") as project_fd:
         from ninja_syntax import Writer
 
         project_writer = Writer(project_fd)
         project_writer.include(str(build_dir / "rules.ninja"))
 
+        # The builds on the previous build's critical path are written first, so their edges are started first.
+        project_builds = builds
+        if durations:
+            priorities = build_priorities(durations, build_dir, graph)
+            project_builds = sorted(
+                builds,
+                key=lambda build_info: priorities[build_info["name"]],
+                reverse=True,
+            )
+
+        for build_info in project_builds:
+            builder.add_to_project(project_writer, build_info)
+
+        # Ninja re-invokes aim when the target file changes or when files are added to or removed from a source
+        # directory (or any directory beneath it), which changes the directory's mtime.
+        src_dirs = set()
         for build_info in builds:
-            print(f'Generating ninja file for {build_info["name"]}')
-            build_info["directory"] = project_dir
-            build_info["build_dir"] = build_dir
-            build_info["global_flags"] = flags
-            build_info["global_defines"] = defines
-            build_info["global_compiler"] = compiler
-            build_info["global_archiver"] = archiver
-
-            if frontend == "msvc":
-                # builder = msvcbuilds.MSVCBuilds(compiler, compiler_c, archiver)
-                assert False, "MSVC frontend is currently not supported."
-            elif frontend == "osx":
-                builder = osxbuilds.OsxBuilds()
-            else:
-                builder = gccbuilds.GCCBuilds()
+            src_dirs.update(to_str(build_info["scanned_dirs"]))
+
+        regenerate_inputs = [str((target_dir / "target.toml").resolve())]
+        regenerate_inputs += sorted(src_dirs)
+
+        project_writer.newline()
+        project_writer.build(
+            outputs="build.ninja",
+            rule="regenerate",
+            implicit=[escape_path(path) for path in regenerate_inputs],
+            variables={
+                "aim": f"{shlex.quote(sys.executable)} -m aim_build.main",
+                "target": shlex.quote(str(target_dir.resolve())),
+                "ninja_dir": shlex.quote(str(build_dir.resolve())),
+            },
+        )
+
+    # Builds that were not regenerated keep the files recorded when they were.
+    generated_files = {
+        build_info["name"]: (
+            build_info["generated_files"]
+            if build_info["name"] in stale_builds
+            else generated_files[build_info["name"]]
+        )
+        for build_info in builds
+    }
+
+    gccbuilds.write_compile_commands(build_dir, builds)
+    save_fingerprints(build_dir, fingerprints, generated_files)
+    return True
+
+
+def get_variant_dir(parsed_toml, build_dir: Path, variant_name=None) -> Path:
+    # The directory that holds the ninja files of a variant. Without variants, it is the target's directory.
+    variants = parsed_toml.get("variants", None)
+    if not variants:
+        if variant_name:
+            raise RuntimeError(
+                f"Failed to find variant {variant_name}. The target does not define any variants."
+            )
+        return build_dir
+
+    if not variant_name:
+        variant_name = parsed_toml.get("defaultVariant", next(iter(variants)))
 
-            builder.build(build_info, parsed_toml, project_writer)
+    if variant_name not in variants:
+        raise RuntimeError(
+            f"Failed to find variant {variant_name}. Variants are: {', '.join(variants)}."
+        )
+    return build_dir / variant_name
 
 
 def entry():
@@ -91,7 +349,11 @@ def entry():
     )
 
     build_parser = sub_parser.add_parser("build", help="executes a build")
-    build_parser.add_argument("build", type=str, help="The build name")
+    build_parser.add_argument("builds", type=str, nargs="*", help="The build names")
+
+    build_parser.add_argument(
+        "--all", help="build every build of the target", action="store_true"
+    )
 
     build_parser.add_argument(
         "--target", type=str, required=True, help="path to target file directory"
@@ -103,6 +365,102 @@ def entry():
         action="store_true",
     )
 
+    build_parser.add_argument(
+        "--log", type=str, help="also write the output of ninja to this file"
+    )
+
+    build_parser.add_argument(
+        "--variant",
+        type=str,
+        help="the variant to build, defaults to the target's default variant",
+    )
+
+    build_parser.add_argument(
+        "--no-daemon",
+        help="build in this process even when a daemon is running for the target",
+        action="store_true",
+    )
+
+    daemon_parser = sub_parser.add_parser(
+        "daemon", help="serves builds of a target from a long running process"
+    )
+    daemon_parser.add_argument(
+        "--target", type=str, required=True, help="path to target file directory"
+    )
+    daemon_parser.add_argument(
+        "--stop", help="stops the daemon for the target", action="store_true"
+    )
+
+    watch_parser = sub_parser.add_parser(
+        "watch", help="rebuilds the builds affected by changes as files are saved"
+    )
+    watch_parser.add_argument(
+        "--target", type=str, required=True, help="path to target file directory"
+    )
+    watch_parser.add_argument("--variant", type=str, help="the variant to build")
+    watch_parser.add_argument(
+        "--debounce",
+        type=int,
+        help="milliseconds without changes to wait for before building",
+    )
+
+    build_parser = sub_parser.add_parser(
+        "generate", help="generates the ninja files without running a build"
+    )
+    build_parser.add_argument(
+        "--target", type=str, required=True, help="path to target file directory"
+    )
+    build_parser.add_argument(
+        "--ninja-dir",
+        type=str,
+        help="the directory of the ninja that runs the generation, set by the ninja files",
+    )
+
+    cache_parser = sub_parser.add_parser("cache", help="manages the compile cache")
+    cache_parser.add_argument(
+        "action",
+        choices=["stats", "prune", "clear"],
+        help="show statistics, evict the least recently used objects or delete the cache",
+    )
+    cache_parser.add_argument(
+        "--max-size",
+        type=str,
+        help="the size to prune the cache down to, e.g. 500M or 2G",
+    )
+
+    stats_parser = sub_parser.add_parser(
+        "stats", help="reports where the time of the last build went"
+    )
+    stats_parser.add_argument(
+        "--target", type=str, required=True, help="path to target file directory"
+    )
+    stats_parser.add_argument("--variant", type=str, help="the variant to report on")
+    stats_parser.add_argument(
+        "--top", type=int, default=10, help="the number of slowest files to show"
+    )
+    stats_parser.add_argument(
+        "--json", help="print the statistics as json", action="store_true"
+    )
+    stats_parser.add_argument(
+        "--trace",
+        type=str,
+        help="also write a chrome trace of the last build to this file",
+    )
+
+    deps_parser = sub_parser.add_parser(
+        "deps", help="reports the headers that cause the most rebuilding"
+    )
+    deps_parser.add_argument(
+        "--target", type=str, required=True, help="path to target file directory"
+    )
+    deps_parser.add_argument("--variant", type=str, help="the variant to report on")
+    deps_parser.add_argument(
+        "--top", type=int, default=10, help="the number of headers to show per build"
+    )
+    deps_parser.add_argument(
+        "--json", help="print the report as json", action="store_true"
+    )
+
     build_parser = sub_parser.add_parser(
         "clobber", help="deletes all build artefacts for the specified target"
     )
@@ -115,7 +473,27 @@ def entry():
     if mode == "init":
         run_init(args.demo)
     elif mode == "build":
-        run_build(args.build, args.target, args.skip_ninja_regen)
+        run_build(
+            args.builds,
+            args.all,
+            args.target,
+            args.skip_ninja_regen,
+            args.log,
+            args.variant,
+            not args.no_daemon,
+        )
+    elif mode == "daemon":
+        run_daemon(args.target, args.stop)
+    elif mode == "watch":
+        run_watch(args.target, args.variant, args.debounce)
+    elif mode == "generate":
+        run_generate(args.target, args.ninja_dir)
+    elif mode == "cache":
+        run_cache(args.action, args.max_size)
+    elif mode == "stats":
+        run_stats(args.target, args.top, args.json, args.trace, args.variant)
+    elif mode == "deps":
+        run_deps(args.target, args.top, args.json, args.variant)
     elif mode == "list":
         run_list(args.target)
     elif mode == "clobber":
@@ -281,8 +659,33 @@ def run_init(add_demo_files):
         (dirs[2] / "calculator.cpp").write_text(CALCULATOR_CPP)
 
 
-def run_build(build_name, target_path, skip_ninja_regen):
-    print("Running build...")
+def generate_target(parsed_toml, build_dir, scanner=None, ninja_dir=None):
+    from aim_build.schema import validate_target
+
+    root_dir = parsed_toml["projectRoot"]
+    project_dir = (build_dir / root_dir).resolve()
+    assert project_dir.exists(), f"{str(project_dir)} does not exist."
+
+    try:
+        validate_target(parsed_toml, project_dir, build_dir)
+    except RuntimeError as e:
+        print(f"Error: {e.args[0]}")
+        exit(-1)
+
+    print("Generating ninja files...")
+    try:
+        generated = run_ninja_generation(parsed_toml, project_dir, build_dir, scanner)
+    except RuntimeError as e:
+        print(f"Error: {e.args[0]}")
+        exit(-1)
+
+    restat_ninja_files(get_variant_dirs(parsed_toml, build_dir), ninja_dir)
+    return generated
+
+
+def run_generate(target_path, ninja_dir=None):
+    import toml
+
     build_dir = Path().cwd()
 
     if target_path:
@@ -292,35 +695,165 @@ def run_build(build_name, target_path, skip_ninja_regen):
         else:
             build_dir = build_dir / Path(target_path)
 
-    # ninja_path = project_dir / "build.ninja"
     toml_path = build_dir / "target.toml"
 
     with toml_path.open("r") as toml_file:
         parsed_toml = toml.loads(toml_file.read())
 
-        builds = parsed_toml["builds"]
-        the_build = find_build(build_name, builds)
-        root_dir = parsed_toml["projectRoot"]
-        project_dir = (build_dir / root_dir).resolve()
-        assert project_dir.exists(), f"{str(project_dir)} does not exist."
+        generate_target(
+            parsed_toml, build_dir, ninja_dir=Path(ninja_dir) if ninja_dir else None
+        )
+
+
+def restat_ninja_files(variant_dirs: List[Path], ninja_dir: Path = None):
+    # Ninja decides whether build.ninja is out of date from the mtime it recorded in its log when it last ran the
+    # regenerate edge, not from the file's own mtime. A build.ninja that aim wrote or touched by itself would be
+    # regenerated again by the next ninja, so the recorded mtimes are updated. The ninja that ran the generation, if
+    # any, records the mtime itself and its log must not be rewritten while it runs.
+    from aim_build.ninjalog import NinjaLogFile
+
+    for variant_dir in variant_dirs:
+        if ninja_dir and variant_dir.resolve() == ninja_dir.resolve():
+            continue
+        if not (variant_dir / NinjaLogFile).exists():
+            continue
+        subprocess.run(
+            ["ninja", f"-C{str(variant_dir)}", "-t", "restat", "build.ninja"],
+            stdout=subprocess.DEVNULL,
+        )
+
+
+def get_variant_dirs(parsed_toml, build_dir: Path) -> List[Path]:
+    variants = parsed_toml.get("variants", None)
+    return [build_dir / name for name in variants] if variants else [build_dir]
+
+
+def find_build_names(graph: BuildGraph, build_names, build_all) -> List[str]:
+    if build_all and build_names:
+        raise RuntimeError("Pass either build names or --all, not both.")
+    if build_all:
+        return list(graph.order)
+    if not build_names:
+        raise RuntimeError("No build names given. Pass the builds to build or --all.")
+    return [graph.find(name)["name"] for name in dict.fromkeys(build_names)]
+
+
+def run_build(
+    build_names,
+    build_all,
+    target_path,
+    skip_ninja_regen,
+    log_path=None,
+    variant_name=None,
+    use_daemon=True,
+):
+    print("Running build...")
+    build_dir = Path().cwd()
+
+    if target_path:
+        target_path = Path(target_path)
+        if target_path.is_absolute():
+            build_dir = target_path
+        else:
+            build_dir = build_dir / Path(target_path)
 
+    if use_daemon:
+        from aim_build.daemon import request_build
+
+        # When a daemon is running for the target, it does the build. Otherwise the build is done here.
         try:
-            target_schema(parsed_toml, project_dir)
+            return_code = request_build(
+                build_dir,
+                {
+                    "builds": build_names,
+                    "all": build_all,
+                    "variant": variant_name,
+                    "skip_ninja_regen": skip_ninja_regen,
+                    "log": str(Path(log_path).resolve()) if log_path else None,
+                },
+            )
         except RuntimeError as e:
             print(f"Error: {e.args[0]}")
             exit(-1)
 
-        if not skip_ninja_regen:
-            print("Generating ninja files...")
-            run_ninja_generation(parsed_toml, project_dir, build_dir)
-            with (build_dir.resolve() / "compile_commands.json").open("w+") as cc:
-                command = ["ninja", "-C", str(build_dir.resolve()), "-t", "compdb"]
-                subprocess.run(command, stdout=cc)
+        if return_code is not None:
+            if return_code != 0:
+                exit(return_code)
+            return
+
+    import toml
+
+    toml_path = build_dir / "target.toml"
+
+    with toml_path.open("r") as toml_file:
+        parsed_toml = toml.loads(toml_file.read())
+
+        try:
+            graph = BuildGraph(parsed_toml["builds"])
+            build_names = find_build_names(graph, build_names, build_all)
+            variant_dir = get_variant_dir(parsed_toml, build_dir, variant_name)
+        except RuntimeError as e:
+            print(f"Error: {e.args[0]}")
+            exit(-1)
+
+        # Once the ninja files exist, ninja itself regenerates them when target.toml or a source directory changes.
+        # Aim only needs to generate them when any are missing or were generated by a different version of aim.
+        if not skip_ninja_regen and ninja_files_missing(variant_dir, graph.order):
+            generate_target(parsed_toml, build_dir)
+
+        return_code = run_ninja(variant_dir, build_names, log_path)
+        if return_code != 0:
+            exit(return_code)
+
+
+def run_daemon(target_path, stop):
+    from aim_build.daemon import Daemon, stop_daemon
+
+    build_dir = Path().cwd()
+
+    if target_path:
+        target_path = Path(target_path)
+        if target_path.is_absolute():
+            build_dir = target_path
+        else:
+            build_dir = build_dir / Path(target_path)
+
+    try:
+        if stop:
+            stop_daemon(build_dir)
+        else:
+            Daemon(build_dir).serve()
+    except RuntimeError as e:
+        print(f"Error: {e.args[0]}")
+        exit(-1)
+
+
+def run_watch(target_path, variant_name, debounce):
+    from aim_build.watchmode import WatchMode
+
+    build_dir = Path().cwd()
 
-        run_ninja(build_dir, the_build["name"])
+    if target_path:
+        target_path = Path(target_path)
+        if target_path.is_absolute():
+            build_dir = target_path
+        else:
+            build_dir = build_dir / Path(target_path)
+
+    try:
+        WatchMode(build_dir, variant_name, debounce).run()
+    except RuntimeError as e:
+        print(f"Error: {e.args[0]}")
+        exit(-1)
 
 
 def run_list(target_path):
+    import toml
+
+    from aim_build import gccbuilds
+    from aim_build import msvcbuilds
+    from aim_build import osxbuilds
+
     build_dir = Path().cwd()
 
     if target_path:
@@ -363,6 +896,206 @@ def run_list(target_path):
         print()
 
 
+def run_cache(action, max_size):
+    from aim_build.compilecache import CompileCache, format_size, parse_size
+
+    cache = CompileCache()
+
+    if action == "stats":
+        stats = cache.stats()
+        hits = stats["hits"] + stats["remote_hits"]
+        lookups = hits + stats["misses"]
+        hit_rate = 100.0 * hits / lookups if lookups else 0.0
+        table = [
+            ["Cache directory", str(cache.cache_dir)],
+            ["Hits", stats["hits"]],
+            ["Remote hits", stats["remote_hits"]],
+            ["Misses", stats["misses"]],
+            ["Hit rate", f"{hit_rate:.1f}%"],
+            ["Objects", stats["entries"]],
+            ["Size", format_size(stats["size"])],
+            ["Maximum size", format_size(stats["max_size"])],
+        ]
+
+        from tabulate import tabulate
+
+        print()
+        print(tabulate(table))
+        print()
+    elif action == "prune":
+        max_size = parse_size(max_size) if max_size else None
+        removed = cache.prune(max_size)
+        print(f"Removed {removed} objects from {str(cache.cache_dir)}.")
+    elif action == "clear":
+        print(f"Clearing {str(cache.cache_dir)}...")
+        cache.clear()
+
+
+def format_duration(milliseconds):
+    return f"{milliseconds / 1000:.2f}s"
+
+
+def run_stats(target_path, top, as_json, trace_path, variant_name=None):
+    import toml
+
+    from aim_build.ninjalog import build_stats, chrome_trace
+
+    build_dir = Path().cwd()
+
+    if target_path:
+        target_path = Path(target_path)
+        if target_path.is_absolute():
+            build_dir = target_path
+        else:
+            build_dir = build_dir / Path(target_path)
+
+    toml_path = build_dir / "target.toml"
+
+    with toml_path.open("r") as toml_file:
+        parsed_toml = toml.loads(toml_file.read())
+
+    try:
+        graph = BuildGraph(parsed_toml["builds"])
+        variant_dir = get_variant_dir(parsed_toml, build_dir, variant_name)
+        stats = build_stats(variant_dir, graph, top)
+        if trace_path:
+            Path(trace_path).write_text(json.dumps(chrome_trace(variant_dir, graph)))
+    except RuntimeError as e:
+        print(f"Error: {e.args[0]}")
+        exit(-1)
+
+    if as_json:
+        print(json.dumps(stats, indent=2))
+        return
+
+    from tabulate import tabulate
+
+    print()
+    summary = [
+        ["Edges", stats["edges"]],
+        ["Wall time", format_duration(stats["wall_ms"])],
+        ["CPU time", format_duration(stats["total_ms"])],
+        ["Parallelism", f"{stats['parallelism']:.1f}"],
+        [
+            "Utilisation",
+            f"{100.0 * stats['utilisation']:.1f}% of {stats['jobs']} ninja jobs",
+        ],
+        ["Critical path", format_duration(stats["critical_path_ms"])],
+    ]
+    print(tabulate(summary))
+    print()
+
+    table = [
+        [
+            build["name"],
+            build["edges"],
+            format_duration(build["compile_ms"]),
+            format_duration(build["link_ms"]),
+            format_duration(build["total_ms"]),
+        ]
+        for build in stats["builds"]
+    ]
+    print(tabulate(table, ["Build", "Edges", "Compile", "Link", "Total"]))
+    print()
+
+    table = [
+        [format_duration(entry["duration_ms"]), entry["build"], entry["output"]]
+        for entry in stats["slowest"]
+    ]
+    print(tabulate(table, ["Time", "Build", "Slowest translation units"]))
+    print()
+
+    table = [
+        [
+            format_duration(entry["start_ms"]),
+            format_duration(entry["duration_ms"]),
+            entry["build"],
+            entry["output"],
+        ]
+        for entry in stats["critical_path"]
+    ]
+    print(tabulate(table, ["Start", "Time", "Build", "Critical path"]))
+    print()
+
+
+def run_deps(target_path, top, as_json, variant_name=None):
+    import toml
+
+    from aim_build import gccbuilds
+    from aim_build.includescanner import dependency_report
+    from aim_build.srcscanner import SourceCacheFile, SourceScanner
+
+    build_dir = Path().cwd()
+
+    if target_path:
+        target_path = Path(target_path)
+        if target_path.is_absolute():
+            build_dir = target_path
+        else:
+            build_dir = build_dir / Path(target_path)
+
+    toml_path = build_dir / "target.toml"
+
+    with toml_path.open("r") as toml_file:
+        parsed_toml = toml.loads(toml_file.read())
+
+    project_dir = (build_dir / parsed_toml["projectRoot"]).resolve()
+    builds = parsed_toml["builds"]
+
+    try:
+        graph = BuildGraph(builds)
+        variant_dir = get_variant_dir(parsed_toml, build_dir, variant_name)
+    except RuntimeError as e:
+        print(f"Error: {e.args[0]}")
+        exit(-1)
+
+    # The source directory listings are shared with generation, but are not saved, so looking at the report never
+    # changes what ninja sees.
+    scanner = SourceScanner(build_dir / SourceCacheFile)
+    src_files = {}
+    include_dirs = {}
+    for build_info in builds:
+        build_info["directory"] = project_dir
+        src_files[build_info["name"]], _ = gccbuilds.get_src_files(build_info, scanner)
+
+        include_paths = list(build_info.get("includePaths", []))
+        for required in graph.transitive_requires(build_info["name"])[::-1]:
+            include_paths += required.get("includePaths", [])
+        include_dirs[build_info["name"]] = to_str(
+            prepend_paths(project_dir, list(dict.fromkeys(include_paths)))
+        )
+
+    report = dependency_report(
+        variant_dir, project_dir, graph, src_files, include_dirs, top
+    )
+
+    if as_json:
+        print(json.dumps(report, indent=2))
+        return
+
+    from tabulate import tabulate
+
+    for name in graph.order:
+        build_report = report[name]
+        print()
+        print(
+            f"{name}: {build_report['translation_units']} translation units, "
+            f"maximum include depth {build_report['max_include_depth']}"
+            + (" (not built yet)" if build_report["source"] == "scan" else "")
+        )
+        table = [
+            [
+                header["dependants"],
+                "-" if header["depth"] is None else header["depth"],
+                format_duration(header["rebuild_ms"]),
+                relpath(Path(header["header"]), project_dir),
+            ]
+            for header in build_report["headers"]
+        ]
+        print(tabulate(table, ["Dependants", "Depth", "Rebuild cost", "Header"]))
+    print()
+
+
 def run_clobber(target_path):
     build_dir = Path().cwd()
 
@@ -2,6 +2,7 @@ import functools
 from typing import Dict
 from ninja_syntax import Writer
 
+from aim_build.buildgraph import BuildGraph
 from aim_build.msvcbuildrules import *
 from aim_build.utils import *
 
@@ -100,7 +101,7 @@ class MSVCBuilds:
             add_exe(writer)
             add_shared(writer)
 
-    def build(self, build):
+    def build(self, build, graph: BuildGraph):
         the_build = build["buildRule"]
 
         build_name = build["name"]
@@ -123,7 +124,7 @@ class MSVCBuilds:
             if the_build == "staticlib":
                 self.build_static_library(ninja_writer, build)
             elif the_build == "exe":
-                self.build_executable(ninja_writer, build)
+                self.build_executable(ninja_writer, build, graph)
             elif the_build == "dynamiclib":
                 self.build_dynamic_library(ninja_writer, build)
             else:
@@ -141,7 +142,7 @@ class MSVCBuilds:
         # Without the absolute path to the obj files, it would build the files again
         # in the current (exe's) build location.
         build_path = build["buildPath"]
-        obj_files = ToObjectFiles(src_files)
+        obj_files = ToObjectFiles(src_files, build["directory"])
         obj_files = prepend_paths(build_path, obj_files)
 
         file_pairs = zip(to_str(src_files), to_str(obj_files))
@@ -173,12 +174,11 @@ class MSVCBuilds:
         nfw.build(rule="phony", inputs=library_name, outputs=build_name)
         nfw.newline()
 
-    def build_executable(self, nfw, build: Dict):
+    def build_executable(self, nfw, build: Dict, graph: BuildGraph):
         build_name = build["name"]
         exe_name = build["outputName"]
         cxxflags = build["flags"]
         defines = build["defines"]
-        requires = build.get("requires", [])
         build_path = build["buildPath"]
 
         includes = get_include_paths(build)
@@ -188,8 +188,10 @@ class MSVCBuilds:
 
         linker_args = library_paths + link_libraries + third_libraries
 
-        for requirement in requires:
-            ninja_file = (build_path.parent / requirement / "build.ninja").resolve()
+        for requirement in graph.requires(build_name):
+            ninja_file = (
+                build_path.parent / requirement["name"] / "build.ninja"
+            ).resolve()
             assert ninja_file.exists(), f"Failed to find {str(ninja_file)}."
             nfw.subninja(escape_path(str(ninja_file)))
             nfw.newline()
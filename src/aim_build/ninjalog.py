@@ -0,0 +1,286 @@
+import os
+from pathlib import Path
+from typing import Dict, List, NamedTuple
+
+from aim_build.buildgraph import BuildGraph
+
+NinjaLogFile = ".ninja_log"
+
+ObjectSuffixes = [".o", ".obj"]
+PchSuffixes = [".gch", ".pch"]
+
+
+class LogEntry(NamedTuple):
+    # Times are in milliseconds since the start of the ninja invocation that ran the edge.
+    start: int
+    end: int
+    output: str
+
+    @property
+    def duration(self) -> int:
+        return self.end - self.start
+
+
+def parse_ninja_log(log_path: Path) -> List[LogEntry]:
+    # Ninja appends a line per output, "start end mtime output hash", when the edge that produces it finishes.
+    entries = []
+    with log_path.open("r") as log_file:
+        header = log_file.readline()
+        if not header.startswith("# ninja log v"):
+            raise RuntimeError(f"{str(log_path)} is not a ninja log.")
+
+        for line in log_file:
+            fields = line.rstrip("\n").split("\t")
+            if len(fields) < 5:
+                continue
+            entries.append(LogEntry(int(fields[0]), int(fields[1]), fields[3]))
+
+    return entries
+
+
+def last_run(entries: List[LogEntry]) -> List[LogEntry]:
+    # Within one invocation entries are written as edges finish, so end times never decrease. An end time that goes
+    # backwards marks the start of the next invocation. Invocations that had nothing to do write no entries, so the
+    # last run is the last build that did any work.
+    start = 0
+    for index in range(1, len(entries)):
+        if entries[index].end < entries[index - 1].end:
+            start = index
+
+    # An edge with several outputs is logged once per output.
+    seen = set()
+    run = []
+    for entry in entries[start:]:
+        key = (entry.start, entry.end, entry.output)
+        if key not in seen:
+            seen.add(key)
+            run.append(entry)
+    return run
+
+
+def classify(output: str) -> str:
+    suffix = Path(output).suffix
+    if suffix in ObjectSuffixes:
+        return "compile"
+    if suffix in PchSuffixes:
+        return "pch"
+    return "link"
+
+
+def find_build_name(output: str, build_dir: str, graph: BuildGraph) -> str:
+    # Every build writes its outputs beneath build_dir/<build name>/, see GCCBuilds.build. Anything else, such as
+    # the regeneration of the ninja files, is attributed to aim itself.
+    if not os.path.isabs(output):
+        output = os.path.join(build_dir, output)
+
+    relative = os.path.relpath(os.path.normpath(output), build_dir)
+    build_name = relative.split(os.sep)[0]
+    if build_name not in graph.builds or relative == build_name:
+        return "(aim)"
+    return build_name
+
+
+def map_to_builds(entries: List[LogEntry], build_dir: Path, graph: BuildGraph):
+    build_dir = str(build_dir.resolve())
+    mapped = {}
+    for entry in entries:
+        build_name = find_build_name(entry.output, build_dir, graph)
+        mapped.setdefault(build_name, []).append(entry)
+    return mapped
+
+
+def critical_path(mapped: Dict[str, List[LogEntry]], graph: BuildGraph):
+    # A build's objects only wait for its precompiled header, while its link step waits for its objects and for the
+    # outputs of everything it requires. The longest chain of these, through the build graph, is the critical path.
+    # Steps that were not run by the last build count as free.
+    chains = {}
+    for name in graph.order:
+        entries = mapped.get(name, [])
+        compiles = [entry for entry in entries if classify(entry.output) == "compile"]
+        pchs = [entry for entry in entries if classify(entry.output) == "pch"]
+        links = [entry for entry in entries if classify(entry.output) == "link"]
+
+        own_chain = []
+        if pchs:
+            own_chain.append(max(pchs, key=lambda entry: entry.duration))
+        if compiles:
+            own_chain.append(max(compiles, key=lambda entry: entry.duration))
+
+        chain = own_chain
+        for required in graph.builds[name].get("requires", []):
+            if chain_duration(chains[required]) > chain_duration(chain):
+                chain = chains[required]
+
+        if links:
+            chain = chain + [max(links, key=lambda entry: entry.duration)]
+        chains[name] = chain
+
+    if not chains:
+        return []
+    return max(chains.values(), key=chain_duration)
+
+
+def chain_duration(chain: List[LogEntry]) -> int:
+    return sum(entry.duration for entry in chain)
+
+
+def previous_durations(build_dir: Path) -> Dict[str, int]:
+    # The duration of the most recent build of every output, across all runs.
+    log_path = build_dir / NinjaLogFile
+    if not log_path.exists():
+        return {}
+
+    try:
+        entries = parse_ninja_log(log_path)
+    except (RuntimeError, ValueError):
+        return {}
+    return {entry.output: entry.duration for entry in entries}
+
+
+def build_priorities(
+    durations: Dict[str, int], build_dir: Path, graph: BuildGraph
+) -> Dict[str, int]:
+    # A build's priority is the longest chain of steps from its slowest compile to the end of the whole build: its
+    # own precompiled header, slowest compile and link, followed by the most expensive chain of links through the
+    # builds that require it.
+    entries = [LogEntry(0, duration, output) for output, duration in durations.items()]
+    mapped = map_to_builds(entries, build_dir, graph)
+
+    def slowest(name, kind):
+        kind_durations = [
+            entry.duration
+            for entry in mapped.get(name, [])
+            if classify(entry.output) == kind
+        ]
+        return max(kind_durations, default=0)
+
+    tails = {}
+    priorities = {}
+    for name in reversed(graph.order):
+        tail = slowest(name, "link")
+        tail += max(
+            (tails[dependant] for dependant in graph.dependants[name]), default=0
+        )
+        tails[name] = tail
+        priorities[name] = slowest(name, "pch") + slowest(name, "compile") + tail
+    return priorities
+
+
+def ninja_default_jobs() -> int:
+    # The number of jobs ninja runs when -j is not given, see GuessParallelism in ninja's ninja.cc. Aim never passes
+    # -j, and ninja deliberately runs more jobs than there are CPUs.
+    processors = os.cpu_count() or 1
+    if processors <= 1:
+        return 2
+    if processors == 2:
+        return 3
+    return processors + 2
+
+
+def build_stats(build_dir: Path, graph: BuildGraph, top: int = 10) -> Dict:
+    log_path = build_dir / NinjaLogFile
+    if not log_path.exists():
+        raise RuntimeError(
+            f"Failed to find {str(log_path)}. Run a build before asking for its statistics."
+        )
+
+    run = last_run(parse_ninja_log(log_path))
+    mapped = map_to_builds(run, build_dir, graph)
+    build_names = {entry: name for name, entries in mapped.items() for entry in entries}
+
+    wall_time = (
+        max(entry.end for entry in run) - min(entry.start for entry in run)
+        if run
+        else 0
+    )
+    total_time = sum(entry.duration for entry in run)
+    parallelism = total_time / wall_time if wall_time else 0.0
+    jobs = ninja_default_jobs()
+
+    translation_units = sorted(
+        [entry for entry in run if classify(entry.output) == "compile"],
+        key=lambda entry: entry.duration,
+        reverse=True,
+    )
+
+    builds = []
+    for name in graph.order + ["(aim)"]:
+        entries = mapped.get(name, [])
+        if not entries:
+            continue
+        kinds = {"compile": 0, "pch": 0, "link": 0}
+        for entry in entries:
+            kinds[classify(entry.output)] += entry.duration
+        builds.append(
+            {
+                "name": name,
+                "edges": len(entries),
+                "total_ms": sum(kinds.values()),
+                "compile_ms": kinds["compile"] + kinds["pch"],
+                "link_ms": kinds["link"],
+            }
+        )
+    builds.sort(key=lambda build: build["total_ms"], reverse=True)
+
+    path = critical_path(mapped, graph)
+
+    def describe(entry: LogEntry):
+        return {
+            "output": entry.output,
+            "build": build_names[entry],
+            "start_ms": entry.start,
+            "duration_ms": entry.duration,
+        }
+
+    return {
+        "edges": len(run),
+        "wall_ms": wall_time,
+        "total_ms": total_time,
+        "parallelism": parallelism,
+        # The average share of ninja's jobs that were busy. Capped, as ninja may have been run by hand with more jobs.
+        "utilisation": min(parallelism / jobs, 1.0),
+        "jobs": jobs,
+        "slowest": [describe(entry) for entry in translation_units[:top]],
+        "builds": builds,
+        "critical_path": [describe(entry) for entry in path],
+        "critical_path_ms": chain_duration(path),
+    }
+
+
+def chrome_trace(build_dir: Path, graph: BuildGraph) -> Dict:
+    # Trace event format, viewable in chrome://tracing or https://ui.perfetto.dev. Ninja does not log which job ran
+    # an edge, so edges are packed into as few rows as possible, which shows how many jobs were busy over time.
+    run = last_run(parse_ninja_log(build_dir / NinjaLogFile))
+    mapped = map_to_builds(run, build_dir, graph)
+
+    lanes = []
+    events = []
+    for name, entries in mapped.items():
+        for entry in entries:
+            events.append((entry, name))
+    events.sort(key=lambda event: event[0].start)
+
+    trace_events = []
+    for entry, name in events:
+        for lane, lane_end in enumerate(lanes):
+            if lane_end <= entry.start:
+                break
+        else:
+            lane = len(lanes)
+            lanes.append(0)
+        lanes[lane] = entry.end
+
+        trace_events.append(
+            {
+                "name": os.path.basename(entry.output),
+                "cat": name,
+                "ph": "X",
+                "ts": entry.start * 1000,
+                "dur": entry.duration * 1000,
+                "pid": 0,
+                "tid": lane,
+                "args": {"output": entry.output, "kind": classify(entry.output)},
+            }
+        )
+
+    return {"traceEvents": trace_events, "displayTimeUnit": "ms"}
@@ -1,35 +1,74 @@
 from ninja_syntax import Writer
 
 
-def add_compile(nfw: Writer):
-    command = f"$compiler $defines $flags -MMD -MF deps.d $includes -c $in -o $out"
+def add_pools(nfw: Writer, pools):
+    # Edges opt into a pool with a `pool` variable. Ninja's built in `console` pool is always available.
+    for name, depth in sorted(pools.items()):
+        nfw.pool(name, depth)
+        nfw.newline()
+
+
+def add_compile(nfw: Writer, launcher=""):
+    # Each object gets its own depfile. Ninja moves the dependencies into .ninja_deps and deletes the depfile.
+    # The launcher, when set, is a command that runs the compiler for us, such as the compile cache.
+    command = (
+        f"{launcher}$compiler $defines $flags -MMD -MF $out.d $includes -c $in -o $out"
+    )
     nfw.rule(
         name="compile",
         description="Compiles source files into object files",
         deps="gcc",
-        depfile="deps.d",
+        depfile="$out.d",
         command=command,
     )
     nfw.newline()
 
 
-def add_ar(nfw: Writer):
+def add_pch(nfw: Writer):
+    command = "$compiler $defines $flags -x c++-header -MMD -MF $out.d $includes -c $in -o $out"
+    nfw.rule(
+        name="pch",
+        description="Precompiles a header",
+        deps="gcc",
+        depfile="$out.d",
+        command=command,
+    )
+    nfw.newline()
+
+
+def add_ar(nfw: Writer, launcher=""):
+    # `ar cr` adds to an existing archive, so objects of deleted sources would stay in it. The archive is removed
+    # first. A cached archive must only ever contain the inputs its key was computed from.
     nfw.rule(
         name="archive",
         description="Combine object files into an archive",
-        command="$archiver cr $out $in",
+        command=f"rm -f $out && {launcher}$archiver cr $out $in",
     )
     nfw.newline()
 
 
-def add_exe(nfw: Writer):
+def add_exe(nfw: Writer, launcher=""):
     # TODO: origin should only really be added when we need to link against an so.
-    command = f"$compiler $defines $flags $includes $in -o $exe_name $linker_args"
+    command = (
+        f"{launcher}$compiler $defines $flags $includes $in -o $exe_name $linker_args"
+    )
     nfw.rule(name="exe", description="Builds an executable.", command=command)
     nfw.newline()
 
 
-def add_shared(nfw: Writer):
-    command = f"$compiler $defines -shared -fvisibility=hidden -fPIC $flags $includes $in -o $out $linker_args"
+def add_shared(nfw: Writer, launcher=""):
+    command = f"{launcher}$compiler $defines -shared -fvisibility=hidden -fPIC $flags $includes $in -o $out $linker_args"
     nfw.rule(name="shared", description="Builds a shared library.", command=command)
     nfw.newline()
+
+
+def add_regenerate(nfw: Writer):
+    # Generator rules are not rebuilt when their command line changes and are not removed by ninja's clean tool.
+    command = "$aim generate --target $target --ninja-dir $ninja_dir"
+    nfw.rule(
+        name="regenerate",
+        description="Regenerating ninja files",
+        command=command,
+        generator=True,
+    )
+    nfw.newline()
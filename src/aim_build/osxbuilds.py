@@ -1,19 +1,24 @@
 from typing import Dict
 from pathlib import Path
 from aim_build.utils import prepend_paths, relpath, escape_path
-from aim_build.gccbuilds import GCCBuilds
-from aim_build.gccbuilds import find_build, PrefixLibraryPath, PrefixLibrary
+from aim_build.gccbuilds import (
+    GCCBuilds,
+    get_cache_launchers,
+    get_lto_cache_settings,
+    get_lto_compile_flags,
+    get_lto_mode,
+)
+from aim_build.buildgraph import BuildGraph
+from aim_build.gccbuilds import PrefixLibraryPath, PrefixLibrary
 from aim_build.osxbuildrules import *
 
 
-def get_rpath(build: Dict, parsed_toml: Dict):
+def get_rpath(build: Dict, graph: BuildGraph):
     # Good blog post about rpath:
     # https://medium.com/@nehckl0/creating-relocatable-linux-executables-by-setting-rpath-with-origin-45de573a2e98
-    requires = build.get("requires", [])
     library_paths = []
 
-    for required in requires:
-        the_dep = find_build(required, parsed_toml["builds"])
+    for the_dep in graph.transitive_requires(build["name"]):
         if the_dep["buildRule"] == "dynamiclib":
             library_paths.append(the_dep["name"])
 
@@ -32,18 +37,53 @@ def get_rpath(build: Dict, parsed_toml: Dict):
 
 
 class OsxBuilds(GCCBuilds):
-    def add_rules(self, build):
-        directory = build["build_dir"]
-        ninja_path = directory / "rules.ninja"
+    def add_rules(self, build_dir, parsed_toml):
+        compile_launcher, artifact_launcher = get_cache_launchers(parsed_toml)
+
+        ninja_path = build_dir / "rules.ninja"
         with ninja_path.open("w+") as ninja_file:
             writer = Writer(ninja_file)
-            add_compile(writer)
-            add_ar(writer)
-            add_exe(writer)
-            add_shared(writer)
+            add_pools(writer, parsed_toml.get("pools", {}))
+            add_compile(writer, compile_launcher)
+            add_pch(writer)
+            add_ar(writer, artifact_launcher)
+            add_exe(writer, artifact_launcher)
+            add_shared(writer, artifact_launcher)
+            add_regenerate(writer)
+
+    def get_rpath(self, build: Dict, graph: BuildGraph):
+        return get_rpath(build, graph)
+
+    def get_lto_archiver(self, archiver, compiler, lto):
+        # Apple's ar indexes LLVM bitcode through libLTO, and Xcode does not ship llvm-ar.
+        return archiver
+
+    def get_lto_link_flags(self, build: Dict, compiler):
+        if build.get("global_linker", None):
+            # The ThinLTO cache flags below are ld64's.
+            return super().get_lto_link_flags(build, compiler)
 
-    def get_rpath(self, build: Dict, parsed_toml: Dict):
-        return get_rpath(build, parsed_toml)
+        lto = get_lto_mode(build)
+        link_flags = get_lto_compile_flags(lto, compiler)
+        if lto != "thin":
+            return link_flags
+
+        cache_dir, cache_size, prune_after = get_lto_cache_settings(build)
+        return link_flags + [
+            f"-Wl,-cache_path_lto,{str(cache_dir)}",
+            f"-Wl,-max_relative_cache_size_lto,{cache_size}",
+            f"-Wl,-prune_after_lto,{prune_after * 3600}",
+        ]
+
+    def get_linker_flags(self, build: Dict, compiler):
+        # Xcode links with ld64 and does not ship lld, so a different linker is only used when it is configured.
+        if build.get("global_gdb_index", False):
+            raise RuntimeError(
+                f"{build['name']}: gdbIndex is not supported on macOS, its linkers do not write a gdb index."
+            )
+
+        linker = build.get("global_linker", None)
+        return [f"-fuse-ld={linker}"] if linker else []
 
     # TODO: These should take version strings as well.
     def add_static_library_naming_convention(self, library_name):
@@ -54,3 +94,6 @@ class OsxBuilds(GCCBuilds):
 
     def add_exe_naming_convention(self, exe_name):
         return f"{exe_name}.exe"
+
+    def add_precompiled_header_naming_convention(self, header_name, compiler):
+        return f"{header_name}.pch"
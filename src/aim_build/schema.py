@@ -1,11 +1,19 @@
+import functools
+import os
+
 import cerberus
 from pathlib import Path
 from typing import Union
 
+from aim_build.fingerprint import hash_object
+from aim_build.version import __version__
+
+ValidationFile = ".aim_validated"
+
 
 class UniqueNameChecker:
     def __init__(self):
-        self.name_lookup = []
+        self.name_lookup = set()
 
     def check(self, field, value, error):
         if value in self.name_lookup:
@@ -14,38 +22,96 @@ class UniqueNameChecker:
                 f"The name field must be unique. The name {value} has already been used.",
             )
         else:
-            self.name_lookup.append(value)
+            self.name_lookup.add(value)
 
 
 class RequiresExistChecker:
     def __init__(self, document):
-        self.doc = document
+        self.names = {
+            build.get("name", None)
+            for build in document.get("builds", [])
+            if isinstance(build, dict)
+        }
 
     def check(self, field, requires, error):
-        builds = self.doc["builds"]
         for value in requires:
-            for build in builds:
-                if value == build["name"]:
-                    break
-            else:
+            if value not in self.names:
                 error(field, f"{value} does not match any build name. Check spelling.")
 
 
+class PoolExistChecker:
+    def __init__(self, document):
+        self.doc = document
+
+    def check(self, field, pool, error):
+        # The console pool is built into ninja.
+        if pool != "console" and pool not in self.doc.get("pools", {}):
+            error(field, f"{pool} does not match any pool name. Check spelling.")
+
+
+class VariantExistChecker:
+    def __init__(self, document):
+        self.doc = document
+
+    def check(self, field, variant, error):
+        if variant not in self.doc.get("variants", {}):
+            error(field, f"{variant} does not match any variant name. Check spelling.")
+
+
 class PathChecker:
     def __init__(self, project_dir):
-        self.project_dir = project_dir
+        self.project_dir = str(project_dir)
+        # Builds tend to share include paths and source directories, so every path is only checked once.
+        self.exists = {}
 
     def check(self, field, paths, error):
-        paths = [(self.project_dir / the_path).resolve() for the_path in paths]
+        # Strings go through the same code path as lists.
+        if isinstance(paths, str):
+            paths = [paths]
 
-        for directory in paths:
+        for the_path in paths:
             # Remember paths can now be directories or specific paths to files.
-            if not directory.exists():
-                error(field, f"{str(directory)} does not exist.")
+            if the_path not in self.exists:
+                full_path = os.path.join(self.project_dir, the_path)
+                self.exists[the_path] = os.path.exists(full_path)
+
+            if not self.exists[the_path]:
+                full_path = os.path.normpath(os.path.join(self.project_dir, the_path))
+                error(field, f"{full_path} does not exist.")
                 break
 
 
+class ValidationContext:
+    # The state of one validation. It is shared by the validator and all of its child validators.
+    def __init__(self, document, project_dir):
+        self.unique_name_checker = UniqueNameChecker()
+        self.requires_exist_checker = RequiresExistChecker(document)
+        self.pool_exist_checker = PoolExistChecker(document)
+        self.variant_exist_checker = VariantExistChecker(document)
+        self.path_checker = PathChecker(project_dir)
+
+
 class AimCustomValidator(cerberus.Validator):
+    @property
+    def context(self) -> ValidationContext:
+        # Keyword arguments are passed on to child validators, so they all see the same context.
+        return self._config["context"]
+
+    def _check_with_unique_name(self, field, value):
+        self.context.unique_name_checker.check(field, value, self._error)
+
+    def _check_with_requires_exist(self, field, value):
+        self.context.requires_exist_checker.check(field, value, self._error)
+
+    def _check_with_pool_exists(self, field, value):
+        self.context.pool_exist_checker.check(field, value, self._error)
+
+    def _check_with_variant_exists(self, field, value):
+        self.context.variant_exist_checker.check(field, value, self._error)
+
+    def _check_with_paths_exist(self, field, value):
+        self.context.path_checker.check(field, value, self._error)
+
     def _check_with_output_naming_convention(self, field, value: Union[str, list]):
         # if you need more context then you can get it using the line below.
         # if self.document["buildRule"] in ["staticlib", "dynamiclib"]:
@@ -84,96 +150,186 @@ class AimCustomValidator(cerberus.Validator):
                 self._error(field, error_str)
 
 
-def target_schema(document, project_dir):
-    unique_name_checker = UniqueNameChecker()
-    requires_exist_checker = RequiresExistChecker(document)
-    path_checker = PathChecker(project_dir)
-
-    schema = {
-        "compiler": {"required": True, "type": "string"},
-        "ar": {"required": True, "type": "string"},
-        "compilerFrontend": {
-            "required": True,
-            "type": "string",
-            "allowed": ["msvc", "gcc", "osx"],
+TargetSchema = {
+    "compiler": {"required": True, "type": "string"},
+    "ar": {"required": True, "type": "string"},
+    "compilerFrontend": {
+        "required": True,
+        "type": "string",
+        "allowed": ["msvc", "gcc", "osx"],
+    },
+    "flags": {"type": "list", "schema": {"type": "string"}, "empty": False},
+    "defines": {"type": "list", "schema": {"type": "string"}, "empty": False},
+    "projectRoot": {"required": True, "type": "string", "empty": False},
+    "compileCache": {"type": "boolean"},
+    "remoteCache": {"type": "string", "empty": False},
+    "pools": {
+        "type": "dict",
+        "keysrules": {"type": "string", "regex": "[a-zA-Z0-9_-]+"},
+        "valuesrules": {"type": "integer", "min": 1},
+    },
+    "compilePool": {"type": "string", "check_with": "pool_exists"},
+    "linkPool": {"type": "string", "check_with": "pool_exists"},
+    "schedulingHints": {"type": "boolean"},
+    "lto": {"type": "string", "allowed": ["thin", "full"]},
+    "ltoCacheSize": {"type": "integer", "min": 1, "max": 100},
+    "ltoCachePruneAfter": {"type": "integer", "min": 1},
+    "variants": {
+        "type": "dict",
+        "empty": False,
+        "keysrules": {"type": "string", "regex": "[a-zA-Z0-9_-]+"},
+        "valuesrules": {
+            "type": "dict",
+            "schema": {
+                "flags": {"type": "list", "schema": {"type": "string"}},
+                "defines": {"type": "list", "schema": {"type": "string"}},
+                "lto": {"type": "string", "allowed": ["thin", "full"]},
+                "splitDwarf": {"type": "boolean"},
+                "linker": {
+                    "type": "string",
+                    "allowed": ["bfd", "gold", "lld", "mold"],
+                },
+                "gdbIndex": {"type": "boolean"},
+            },
         },
-        "flags": {"type": "list", "schema": {"type": "string"}, "empty": False},
-        "defines": {"type": "list", "schema": {"type": "string"}, "empty": False},
-        "projectRoot": {"required": True, "type": "string", "empty": False},
-        "builds": {
-            "required": True,
-            "type": "list",
+    },
+    "defaultVariant": {
+        "type": "string",
+        "check_with": "variant_exists",
+    },
+    "splitDwarf": {"type": "boolean"},
+    "linker": {"type": "string", "allowed": ["bfd", "gold", "lld", "mold"]},
+    # BFD can not write a gdb index.
+    "gdbIndex": {
+        "type": "boolean",
+        "dependencies": {"linker": ["gold", "lld", "mold"]},
+    },
+    "builds": {
+        "required": True,
+        "type": "list",
+        "schema": {
+            "type": "dict",
             "schema": {
-                "type": "dict",
-                "schema": {
-                    "name": {
-                        "required": True,
-                        "type": "string",
-                        "check_with": unique_name_checker.check,
-                    },
-                    "compiler": {"required": False, "type": "string"},
-                    "defines": {
-                        "type": "list",
-                        "schema": {"type": "string"},
-                        "default": [],
-                    },
-                    "flags": {
-                        "type": "list",
-                        "schema": {"type": "string"},
-                        "empty": False,
-                    },
-                    "requires": {
-                        "type": "list",
-                        "empty": False,
-                        "schema": {"type": "string"},
-                        "check_with": requires_exist_checker.check,
-                    },
-                    "buildRule": {
-                        "required": True,
-                        "type": "string",
-                        "allowed": ["exe", "staticlib", "dynamiclib"],
-                    },
-                    "outputName": {
-                        "required": True,
-                        "type": "string",
-                        "check_with": "output_naming_convention",
-                    },
-                    "srcDirs": {
-                        "required": True,
-                        "empty": False,
-                        "type": "list",
-                        "schema": {"type": "string"},
-                        "check_with": path_checker.check,
-                    },
-                    "includePaths": {
-                        "type": "list",
-                        "empty": False,
-                        "schema": {"type": "string"},
-                        "check_with": path_checker.check,
-                    },
-                    "libraryPaths": {
-                        "type": "list",
-                        "empty": False,
-                        "schema": {"type": "string"},
-                        # you can't check the library dirs as they may not exist if the project not built before.
-                        # "check_with": path_checker.check,
-                        "dependencies": {"buildRule": ["exe", "dynamiclib"]},
-                    },
-                    "libraries": {
-                        "type": "list",
-                        "empty": False,
-                        "schema": {"type": "string"},
-                        "dependencies": {"buildRule": ["exe", "dynamiclib"]},
-                        "check_with": "output_naming_convention",
-                    },
+                "name": {
+                    "required": True,
+                    "type": "string",
+                    "check_with": "unique_name",
+                },
+                "compiler": {"required": False, "type": "string"},
+                "defines": {
+                    "type": "list",
+                    "schema": {"type": "string"},
+                    "default": [],
+                },
+                "flags": {
+                    "type": "list",
+                    "schema": {"type": "string"},
+                    "empty": False,
+                },
+                "requires": {
+                    "type": "list",
+                    "empty": False,
+                    "schema": {"type": "string"},
+                    "check_with": "requires_exist",
+                },
+                "buildRule": {
+                    "required": True,
+                    "type": "string",
+                    "allowed": ["exe", "staticlib", "dynamiclib"],
+                },
+                "outputName": {
+                    "required": True,
+                    "type": "string",
+                    "check_with": "output_naming_convention",
+                },
+                "srcDirs": {
+                    "required": True,
+                    "empty": False,
+                    "type": "list",
+                    "schema": {"type": "string"},
+                    "check_with": "paths_exist",
+                },
+                "srcPatterns": {
+                    "type": "list",
+                    "empty": False,
+                    "schema": {"type": "string"},
+                },
+                "srcExcludes": {
+                    "type": "list",
+                    "empty": False,
+                    "schema": {"type": "string"},
+                },
+                "precompiledHeader": {
+                    "type": "string",
+                    "empty": False,
+                    "check_with": "paths_exist",
+                },
+                "compilePool": {
+                    "type": "string",
+                    "check_with": "pool_exists",
+                },
+                "linkPool": {
+                    "type": "string",
+                    "check_with": "pool_exists",
+                },
+                "lto": {"type": "string", "allowed": ["thin", "full"]},
+                "unity": {"type": "boolean"},
+                "unityBatchSize": {
+                    "type": "integer",
+                    "min": 1,
+                    "dependencies": {"unity": True},
+                },
+                "includePaths": {
+                    "type": "list",
+                    "empty": False,
+                    "schema": {"type": "string"},
+                    "check_with": "paths_exist",
+                },
+                "libraryPaths": {
+                    "type": "list",
+                    "empty": False,
+                    "schema": {"type": "string"},
+                    # you can't check the library dirs as they may not exist if the project not built before.
+                    # "check_with": "paths_exist",
+                    "dependencies": {"buildRule": ["exe", "dynamiclib"]},
+                },
+                "libraries": {
+                    "type": "list",
+                    "empty": False,
+                    "schema": {"type": "string"},
+                    "dependencies": {"buildRule": ["exe", "dynamiclib"]},
+                    "check_with": "output_naming_convention",
                 },
             },
         },
-    }
+    },
+}
+
 
-    validator = AimCustomValidator()
-    validator.validate(document, schema)
+@functools.lru_cache(maxsize=None)
+def get_definition_schema():
+    # Checking the schema itself is a large part of creating a validator. It is only done once.
+    return AimCustomValidator(TargetSchema).schema
+
+
+def target_schema(document, project_dir):
+    validator = AimCustomValidator(
+        get_definition_schema(), context=ValidationContext(document, project_dir)
+    )
+    validator.validate(document)
 
     # TODO: Handle schema errors. https://docs.python-cerberus.org/en/stable/errors.html
     if validator.errors:
         raise RuntimeError(validator.errors)
+
+
+def validate_target(document, project_dir: Path, build_dir: Path):
+    # A target that validated successfully does not need validating again until it changes. The paths it names are
+    # not checked again either. If one of them has been removed since, generation reports it instead.
+    validation_hash = hash_object([__version__, document, str(project_dir)])
+    validation_path = build_dir / ValidationFile
+    if validation_path.exists() and validation_path.read_text() == validation_hash:
+        return
+
+    target_schema(document, project_dir)
+    validation_path.write_text(validation_hash)
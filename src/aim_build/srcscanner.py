@@ -0,0 +1,123 @@
+import fnmatch
+import json
+import os
+import threading
+from pathlib import Path
+from typing import Tuple
+
+from aim_build.typedefs import PathList, StringList
+
+SourceCacheFile = ".aim_srccache"
+
+
+def matches_any(path: str, patterns: StringList):
+    return any(fnmatch.fnmatch(path, pattern) for pattern in patterns)
+
+
+class SourceScanner:
+    """Recursively finds source files, caching each directory's listing against the directory's mtime.
+
+    Adding, removing or renaming an entry changes the mtime of the directory that contains it, so a cached listing is
+    valid for as long as the mtime is unchanged. On a warm cache a scan only has to stat each directory.
+    """
+
+    def __init__(self, cache_path: Path = None):
+        self.cache_path = cache_path
+        self.listings = {}
+        self.visited = set()
+        self.dirty = False
+        # Several builds can be scanned at the same time by different threads.
+        self.lock = threading.Lock()
+
+        if cache_path and cache_path.exists():
+            try:
+                self.listings = json.loads(cache_path.read_text())
+            except ValueError:
+                # A corrupt cache is rebuilt from scratch.
+                self.listings = {}
+
+    def list_dir(self, directory: str) -> Tuple[StringList, StringList]:
+        mtime = os.stat(directory).st_mtime_ns
+        with self.lock:
+            self.visited.add(directory)
+            cached = self.listings.get(directory)
+            if cached and cached["mtime"] == mtime:
+                return cached["files"], cached["dirs"]
+
+        files = []
+        dirs = []
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                if entry.is_dir():
+                    dirs.append(entry.name)
+                elif entry.is_file():
+                    files.append(entry.name)
+
+        files.sort()
+        dirs.sort()
+        with self.lock:
+            self.listings[directory] = {"mtime": mtime, "files": files, "dirs": dirs}
+            self.dirty = True
+        return files, dirs
+
+    def scan(
+        self,
+        directory: Path,
+        base_path: Path,
+        patterns: StringList,
+        excludes: StringList = None,
+    ) -> Tuple[PathList, PathList]:
+        # Patterns match file names. Excludes match paths relative to `base_path`, so they can exclude single files
+        # or whole directories, e.g. "lib/tests/*" or "*_test.cpp".
+        excludes = excludes if excludes else []
+        src_files = []
+        scanned_dirs = []
+
+        pending = [str(directory)]
+        while pending:
+            current = pending.pop()
+            scanned_dirs.append(Path(current))
+            files, dirs = self.list_dir(current)
+
+            for name in files:
+                if not matches_any(name, patterns):
+                    continue
+
+                path = os.path.join(current, name)
+                if excludes and matches_any(
+                    os.path.relpath(path, str(base_path)), excludes
+                ):
+                    continue
+
+                src_files.append(Path(path))
+
+            for name in reversed(dirs):
+                if name.startswith("."):
+                    continue
+
+                path = os.path.join(current, name)
+                if excludes:
+                    relative_path = os.path.relpath(path, str(base_path))
+                    if matches_any(relative_path, excludes) or matches_any(
+                        relative_path + "/", excludes
+                    ):
+                        continue
+
+                pending.append(path)
+
+        return src_files, scanned_dirs
+
+    def save(self):
+        # Listings of directories that were not visited by this scan are dropped, so directories that have been
+        # deleted or are no longer source directories do not accumulate in the cache.
+        if len(self.visited) != len(self.listings):
+            self.listings = {
+                directory: listing
+                for directory, listing in self.listings.items()
+                if directory in self.visited
+            }
+            self.dirty = True
+
+        if self.cache_path and self.dirty:
+            self.cache_path.write_text(json.dumps(self.listings))
+            self.dirty = False
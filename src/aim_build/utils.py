@@ -6,12 +6,20 @@ from typing import List, Union
 from aim_build.typedefs import PathList, StringList, T
 
 
-def src_to_obj(files) -> StringList:
-    return [x.stem + ".obj" for x in files]
+def mirror_path(path: Path, base_path: Path) -> Path:
+    # Mirrors `path` relative to `base_path`, so files with the same name in different directories map to different
+    # paths. Parent directory references are replaced so the result always stays under the directory it is joined to.
+    relative_path = relpath(path, base_path)
+    parts = ["__" if part == ".." else part for part in relative_path.parts]
+    return Path(*parts)
 
 
-def src_to_o(files) -> StringList:
-    return [x.stem + ".o" for x in files]
+def src_to_obj(files, base_path: Path) -> StringList:
+    return [str(mirror_path(x, base_path)) + ".obj" for x in files]
+
+
+def src_to_o(files, base_path: Path) -> StringList:
+    return [str(mirror_path(x, base_path)) + ".o" for x in files]
 
 
 def to_str(paths) -> StringList:
@@ -58,3 +66,14 @@ def escape_path(word):
 
 def relpath(src_path: Path, dst_path: Path):
     return Path(os.path.relpath(str(src_path), str(dst_path)))
+
+
+def write_if_changed(path: Path, content: str):
+    # Leaves the file, and so its mtime, untouched when the content is the same. Ninja would otherwise rebuild
+    # everything that depends on it.
+    if path.exists() and path.read_text() == content:
+        return False
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(content)
+    return True
@@ -0,0 +1,185 @@
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import time
+from typing import Iterable, List, Tuple
+
+# The kinds of change a watcher reports.
+Created = "created"
+Deleted = "deleted"
+Modified = "modified"
+
+Change = Tuple[str, str]
+
+# From <sys/inotify.h>.
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_NONBLOCK = 0x00000800
+IN_CLOEXEC = 0x00080000
+
+InotifyMask = (
+    IN_CLOSE_WRITE
+    | IN_MOVED_FROM
+    | IN_MOVED_TO
+    | IN_CREATE
+    | IN_DELETE
+    | IN_DELETE_SELF
+)
+InotifyEvent = struct.Struct("iIII")
+
+# How often the polling watcher checks for changes, in seconds.
+PollInterval = 0.5
+
+
+def is_editor_file(path: str) -> bool:
+    # Hidden and backup files, that editors create and delete while saving.
+    name = os.path.basename(path)
+    return name.startswith(".") or name.endswith("~")
+
+
+class InotifyWatcher:
+    """Watches directories for changes to their entries, using Linux's inotify.
+
+    Watches are not recursive. Every directory of interest has to be watched, see `watch`.
+    """
+
+    def __init__(self, libc):
+        self.libc = libc
+        self.fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self.paths = {}
+        self.descriptors = {}
+
+    def watch(self, directories: Iterable[str]):
+        directories = set(directories)
+        for directory in list(self.descriptors):
+            if directory not in directories:
+                self.libc.inotify_rm_watch(self.fd, self.descriptors.pop(directory))
+
+        for directory in directories - set(self.descriptors):
+            descriptor = self.libc.inotify_add_watch(
+                self.fd, os.fsencode(directory), InotifyMask
+            )
+            if descriptor >= 0:
+                self.descriptors[directory] = descriptor
+                self.paths[descriptor] = directory
+
+    def poll(self, timeout: float) -> List[Change]:
+        # Waits up to `timeout` seconds for changes. A timeout of 0 only collects the changes that are pending.
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return []
+
+        changes = []
+        while True:
+            try:
+                data = os.read(self.fd, 65536)
+            except BlockingIOError:
+                break
+
+            offset = 0
+            while offset < len(data):
+                descriptor, mask, _, length = InotifyEvent.unpack_from(data, offset)
+                offset += InotifyEvent.size
+                name = data[offset : offset + length].rstrip(b"\0")
+                offset += length
+
+                if mask & IN_Q_OVERFLOW:
+                    # Events were lost. Everything that is watched may have changed.
+                    changes += [(path, Modified) for path in self.descriptors]
+                    continue
+                if mask & IN_IGNORED:
+                    directory = self.paths.pop(descriptor, None)
+                    self.descriptors.pop(directory, None)
+                    continue
+
+                directory = self.paths.get(descriptor)
+                if directory is None:
+                    continue
+
+                path = os.path.join(directory, os.fsdecode(name)) if name else directory
+                if mask & (IN_CREATE | IN_MOVED_TO):
+                    changes.append((path, Created))
+                elif mask & (IN_DELETE | IN_MOVED_FROM | IN_DELETE_SELF):
+                    changes.append((path, Deleted))
+                else:
+                    changes.append((path, Modified))
+
+        return changes
+
+    def close(self):
+        os.close(self.fd)
+
+
+class PollingWatcher:
+    """Watches directories for changes to their entries by comparing snapshots of their modification times.
+
+    Used where inotify is not available.
+    """
+
+    def __init__(self):
+        self.directories = []
+        self.snapshot = {}
+
+    def take_snapshot(self):
+        snapshot = {}
+        for directory in self.directories:
+            try:
+                snapshot[directory] = os.stat(directory).st_mtime_ns
+                with os.scandir(directory) as entries:
+                    for entry in entries:
+                        if entry.is_file():
+                            snapshot[entry.path] = entry.stat().st_mtime_ns
+            except FileNotFoundError:
+                pass
+        return snapshot
+
+    def watch(self, directories: Iterable[str]):
+        self.directories = sorted(set(directories))
+        self.snapshot = self.take_snapshot()
+
+    def poll(self, timeout: float) -> List[Change]:
+        deadline = time.monotonic() + timeout
+        while True:
+            snapshot = self.take_snapshot()
+            changes = [
+                (path, Created if path not in self.snapshot else Modified)
+                for path, mtime in snapshot.items()
+                if self.snapshot.get(path) != mtime
+            ]
+            changes += [
+                (path, Deleted) for path in self.snapshot if path not in snapshot
+            ]
+            self.snapshot = snapshot
+
+            remaining = deadline - time.monotonic()
+            if changes or remaining <= 0:
+                return changes
+            time.sleep(min(PollInterval, remaining))
+
+    def close(self):
+        pass
+
+
+def make_watcher():
+    # inotify is Linux only. Anywhere else, or if it can not be used, directories are polled.
+    library = ctypes.util.find_library("c")
+    if library and hasattr(os, "fsencode"):
+        try:
+            libc = ctypes.CDLL(library, use_errno=True)
+            if hasattr(libc, "inotify_init1"):
+                return InotifyWatcher(libc)
+        except OSError:
+            pass
+    return PollingWatcher()
@@ -0,0 +1,183 @@
+# Rebuilds the builds that are affected by changes to their files, as the files are saved.
+#
+#     aim watch --target builds/linux
+#
+# The srcDirs and includePaths of every build are watched, recursively. A burst of changes, such as a branch switch or
+# a save of several files, is collected until no change has been seen for the debounce time. The changed files are
+# mapped to the builds whose directories contain them and every build that requires those builds, directly or not.
+# Ninja is then asked for the affected builds only, so it does not have to check the rest of the target.
+import os
+from pathlib import Path
+from typing import Dict, List, Set
+
+from aim_build.buildgraph import BuildGraph
+from aim_build.srcscanner import SourceCacheFile, SourceScanner
+from aim_build.utils import prepend_paths
+
+DefaultDebounce = 200
+
+# How long to wait for a change before checking again, in seconds. Watching ends with Ctrl+C.
+IdleTimeout = 3600
+
+
+def watched_dirs(
+    builds: List[Dict], project_dir: Path, scanner: SourceScanner
+) -> Dict[str, Set[str]]:
+    # The directories to watch for every build. Explicit source files and the precompiled header are watched through
+    # their directory.
+    dirs = {}
+    for build_info in builds:
+        roots = build_info["srcDirs"] + build_info.get("includePaths", [])
+        if "precompiledHeader" in build_info:
+            roots.append(build_info["precompiledHeader"])
+        roots = prepend_paths(project_dir, roots)
+        build_dirs = set()
+        for root in roots:
+            if root.is_dir():
+                # No patterns, only the directories are wanted.
+                _, scanned_dirs = scanner.scan(root, project_dir, [])
+                build_dirs.update(str(directory) for directory in scanned_dirs)
+            elif root.is_file():
+                build_dirs.add(str(root.parent))
+        dirs[build_info["name"]] = build_dirs
+    return dirs
+
+
+def affected_builds(
+    changed: List[str], dirs: Dict[str, Set[str]], graph: BuildGraph
+) -> Set[str]:
+    affected = set()
+    for path in changed:
+        directory = os.path.dirname(path)
+        for name, build_dirs in dirs.items():
+            if directory in build_dirs or path in build_dirs:
+                affected.add(name)
+
+    pending = list(affected)
+    while pending:
+        for dependant in graph.dependants[pending.pop()]:
+            if dependant not in affected:
+                affected.add(dependant)
+                pending.append(dependant)
+    return affected
+
+
+def ninja_targets(affected: Set[str], graph: BuildGraph) -> List[str]:
+    # Building a build builds everything it requires, so only the affected builds that no other affected build
+    # requires have to be asked for.
+    return [
+        name
+        for name in graph.order
+        if name in affected
+        and not any(dependant in affected for dependant in graph.dependants[name])
+    ]
+
+
+class WatchMode:
+    def __init__(self, build_dir: Path, variant_name: str = None, debounce: int = None):
+        from aim_build.watcher import make_watcher
+
+        self.build_dir = build_dir.resolve()
+        self.toml_path = self.build_dir / "target.toml"
+        self.variant_name = variant_name
+        self.debounce = (debounce if debounce is not None else DefaultDebounce) / 1000
+        # The listings are shared with generation, but are not saved, so watching never changes what ninja sees.
+        self.scanner = SourceScanner(self.build_dir / SourceCacheFile)
+        self.watcher = make_watcher()
+        self.load()
+
+    def load(self):
+        # Raises if target.toml is invalid, in which case the previous target is kept.
+        import toml
+
+        from aim_build.main import get_variant_dir
+
+        parsed_toml = toml.loads(self.toml_path.read_text())
+        graph = BuildGraph(parsed_toml["builds"])
+        variant_dir = get_variant_dir(parsed_toml, self.build_dir, self.variant_name)
+        project_dir = (self.build_dir / parsed_toml["projectRoot"]).resolve()
+        dirs = watched_dirs(parsed_toml["builds"], project_dir, self.scanner)
+
+        self.parsed_toml = parsed_toml
+        self.graph = graph
+        self.variant_dir = variant_dir
+        self.dirs = dirs
+        self.watcher.watch(set().union(*dirs.values()) | {str(self.build_dir)})
+
+    def wait_for_changes(self):
+        from aim_build.watcher import is_editor_file
+
+        changes = []
+        while not changes:
+            changes = self.watcher.poll(IdleTimeout)
+
+        while True:
+            more = self.watcher.poll(self.debounce)
+            if not more:
+                break
+            changes += more
+
+        # Aim and ninja write to the target directory. Only target.toml is of interest there.
+        relevant = []
+        for path, kind in changes:
+            if is_editor_file(path):
+                continue
+            if os.path.dirname(path) == str(self.build_dir) and path != str(
+                self.toml_path
+            ):
+                continue
+            relevant.append((path, kind))
+        return relevant
+
+    def rebuild(self, changes):
+        from aim_build.main import run_ninja
+        from aim_build.watcher import Modified
+
+        toml_changed = any(path == str(self.toml_path) for path, _ in changes)
+        if toml_changed or any(kind != Modified for _, kind in changes):
+            # New directories have to be watched and target.toml may have changed what is watched.
+            try:
+                self.load()
+            except (RuntimeError, ValueError) as e:
+                print(f"Error: {e.args[0]}")
+                return
+
+        if toml_changed:
+            # Anything may have changed. Ninja regenerates the ninja files before building.
+            affected = set(self.graph.order)
+        else:
+            affected = affected_builds(
+                [path for path, _ in changes], self.dirs, self.graph
+            )
+
+        targets = ninja_targets(affected, self.graph)
+        if not targets:
+            return
+
+        print(f"Rebuilding {', '.join(targets)}...", flush=True)
+        if run_ninja(self.variant_dir, targets) != 0:
+            print(f"Failed to build {', '.join(targets)}.")
+
+    def run(self):
+        from aim_build.fingerprint import ninja_files_missing
+        from aim_build.main import generate_target
+
+        # As for `aim build`, the ninja files are generated here only when any are missing. Otherwise ninja keeps
+        # them up to date itself.
+        if ninja_files_missing(self.variant_dir, self.graph.order):
+            generate_target(self.parsed_toml, self.build_dir)
+
+        watched = len(set().union(*self.dirs.values()))
+        print(
+            f"Watching {watched} directories of {len(self.graph.order)} builds. Press Ctrl+C to stop.",
+            flush=True,
+        )
+        try:
+            while True:
+                changes = self.wait_for_changes()
+                if changes:
+                    self.rebuild(changes)
+        except KeyboardInterrupt:
+            print("Stopped watching.")
+        finally:
+            self.watcher.close()
@@ -0,0 +1,72 @@
+# Tracks the startup time of the aim command line.
+#
+#     python test/benchmark.py
+#     python test/benchmark.py --target builds/linux --build exe --budget 150
+#
+# Times `aim --version` and, when a target is given, a build that has nothing to do. The target must have been built
+# before. With --budget, exits with an error when a median time is over the budget, in milliseconds, so CI can catch
+# startup regressions.
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+SrcDir = Path(__file__).resolve().parent.parent / "src"
+
+
+def time_command(command, runs):
+    environment = dict(os.environ)
+    environment["PYTHONPATH"] = os.pathsep.join(
+        [str(SrcDir)] + [path for path in [environment.get("PYTHONPATH")] if path]
+    )
+
+    # The first run warms the file system cache and is not counted.
+    subprocess.run(command, env=environment, stdout=subprocess.DEVNULL, check=True)
+
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run(command, env=environment, stdout=subprocess.DEVNULL, check=True)
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Times the startup of aim.")
+    parser.add_argument("--runs", type=int, default=20, help="the number of runs")
+    parser.add_argument("--target", type=str, help="a built target directory")
+    parser.add_argument("--build", type=str, help="the build name to build")
+    parser.add_argument(
+        "--budget", type=float, help="the maximum median time in milliseconds"
+    )
+    args = parser.parse_args()
+
+    aim = [sys.executable, "-m", "aim_build.main"]
+    benchmarks = [("aim --version", aim + ["--version"])]
+    if args.target and args.build:
+        benchmarks.append(
+            (
+                "no-op aim build",
+                aim + ["build", "--target", args.target, args.build],
+            )
+        )
+
+    over_budget = False
+    for name, command in benchmarks:
+        timings = time_command(command, args.runs)
+        median = statistics.median(timings)
+        print(
+            f"{name:<20} median {median:7.1f}ms  min {min(timings):7.1f}ms  max {max(timings):7.1f}ms"
+        )
+        if args.budget and median > args.budget:
+            print(f"{name} is over the budget of {args.budget:.1f}ms.")
+            over_budget = True
+
+    sys.exit(1 if over_budget else 0)
+
+
+if __name__ == "__main__":
+    main()
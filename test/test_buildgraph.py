@@ -0,0 +1,133 @@
+import pytest
+
+from aim_build.buildgraph import BuildGraph
+
+
+def make_build(name, build_rule="staticlib", requires=None):
+    return {"name": name, "buildRule": build_rule, "requires": requires or []}
+
+
+def test_order_puts_requirements_first():
+    graph = BuildGraph(
+        [
+            make_build("exe", "exe", ["a", "b"]),
+            make_build("a", requires=["c"]),
+            make_build("b", requires=["c"]),
+            make_build("c"),
+        ]
+    )
+
+    for name, build in graph.builds.items():
+        for required in build["requires"]:
+            assert graph.order.index(required) < graph.order.index(name)
+
+
+def test_cycle_is_detected():
+    with pytest.raises(
+        RuntimeError, match="Dependency cycle detected: a -> b -> c -> a"
+    ):
+        BuildGraph(
+            [
+                make_build("a", requires=["b"]),
+                make_build("b", requires=["c"]),
+                make_build("c", requires=["a"]),
+            ]
+        )
+
+
+def test_self_requirement_is_a_cycle():
+    with pytest.raises(RuntimeError, match="Dependency cycle detected: a -> a"):
+        BuildGraph([make_build("a", requires=["a"])])
+
+
+def test_unknown_requirement():
+    with pytest.raises(RuntimeError, match="a requires missing"):
+        BuildGraph([make_build("a", requires=["missing"])])
+
+
+def test_long_chain_does_not_recurse():
+    # Deeper than the default recursion limit.
+    count = 2000
+    builds = [make_build("b0")] + [
+        make_build(f"b{index}", requires=[f"b{index - 1}"]) for index in range(1, count)
+    ]
+    graph = BuildGraph(builds)
+    assert graph.order == [f"b{index}" for index in range(count)]
+
+
+def test_closure_is_transitive_and_ordered():
+    graph = BuildGraph(
+        [
+            make_build("exe", "exe", ["a"]),
+            make_build("a", requires=["b"]),
+            make_build("b", requires=["c"]),
+            make_build("c"),
+        ]
+    )
+
+    assert graph.closure["exe"] == ["c", "b", "a"]
+    assert graph.closure["c"] == []
+    assert [build["name"] for build in graph.transitive_requires("exe")] == [
+        "c",
+        "b",
+        "a",
+    ]
+
+
+def test_link_closure_follows_static_libraries():
+    # A static library's requirements are linked by whatever requires it, in the order the linker needs them.
+    graph = BuildGraph(
+        [
+            make_build("exe", "exe", ["a"]),
+            make_build("a", "staticlib", ["b"]),
+            make_build("b", "staticlib", ["c"]),
+            make_build("c", "staticlib"),
+        ]
+    )
+
+    assert graph.link_closure["exe"] == ["a", "b", "c"]
+
+
+def test_link_closure_stops_at_dynamic_libraries():
+    # A dynamic library has already been linked against its requirements.
+    graph = BuildGraph(
+        [
+            make_build("exe", "exe", ["a"]),
+            make_build("a", "dynamiclib", ["b"]),
+            make_build("b", "staticlib"),
+        ]
+    )
+
+    assert graph.link_closure["exe"] == ["a"]
+    assert graph.link_closure["a"] == ["b"]
+
+
+def test_dependants():
+    graph = BuildGraph(
+        [
+            make_build("exe", "exe", ["a", "b"]),
+            make_build("tests", "exe", ["a"]),
+            make_build("a"),
+            make_build("b"),
+        ]
+    )
+
+    assert sorted(graph.dependants["a"]) == ["exe", "tests"]
+    assert graph.dependants["b"] == ["exe"]
+    assert graph.dependants["exe"] == []
+
+
+def test_find_unknown_build():
+    graph = BuildGraph([make_build("a")])
+    with pytest.raises(RuntimeError, match="Failed to find build with name: b"):
+        graph.find("b")
+
+
+def test_rebind_shares_order():
+    graph = BuildGraph([make_build("exe", "exe", ["a"]), make_build("a")])
+    copies = [dict(build, flags=["-O2"]) for build in graph.sorted_builds()]
+    rebound = graph.rebind(copies)
+
+    assert rebound.order == graph.order
+    assert rebound.find("a")["flags"] == ["-O2"]
+    assert "flags" not in graph.find("a")
@@ -0,0 +1,111 @@
+import threading
+
+import pytest
+
+from aim_build.cachebackends import (
+    DirectoryBackend,
+    HttpBackend,
+    make_backend,
+    make_server,
+)
+
+Key = "0123456789abcdef" * 4
+
+
+@pytest.fixture
+def server(tmp_path):
+    server = make_server(tmp_path / "served", 0)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+    thread.join()
+
+
+def make_artifact(tmp_path, content=b"object file"):
+    source = tmp_path / "source.o"
+    source.write_bytes(content)
+    return source
+
+
+def test_directory_round_trip(tmp_path):
+    backend = DirectoryBackend(tmp_path / "store")
+    backend.put(Key, make_artifact(tmp_path))
+
+    destination = tmp_path / "out" / "fetched.o"
+    assert backend.get(Key, destination)
+    assert destination.read_bytes() == b"object file"
+
+
+def test_directory_miss(tmp_path):
+    backend = DirectoryBackend(tmp_path / "store")
+    destination = tmp_path / "fetched.o"
+
+    assert not backend.get(Key, destination)
+    assert not destination.exists()
+
+
+def test_http_round_trip(tmp_path, server):
+    backend = HttpBackend(f"http://127.0.0.1:{server.server_port}/", tmp_path)
+    backend.put(Key, make_artifact(tmp_path))
+
+    destination = tmp_path / "out" / "fetched.o"
+    assert backend.get(Key, destination)
+    assert destination.read_bytes() == b"object file"
+    # The stand-in stores artifacts the way a directory backend does.
+    assert (tmp_path / "served" / Key[:2] / Key).read_bytes() == b"object file"
+
+
+def test_http_not_found_is_a_miss(tmp_path, server):
+    backend = HttpBackend(f"http://127.0.0.1:{server.server_port}", tmp_path)
+    destination = tmp_path / "fetched.o"
+
+    assert not backend.get(Key, destination)
+    assert not destination.exists()
+    # The remote was reachable, so it is not skipped.
+    assert not backend.is_unreachable()
+
+
+def test_http_invalid_key_is_a_miss(tmp_path, server):
+    backend = HttpBackend(f"http://127.0.0.1:{server.server_port}", tmp_path)
+    assert not backend.get("not-a-key", tmp_path / "fetched.o")
+
+
+def test_unreachable_remote_is_marked(tmp_path, server):
+    port = server.server_port
+    server.shutdown()
+    server.server_close()
+
+    backend = HttpBackend(f"http://127.0.0.1:{port}", tmp_path)
+    assert not backend.get(Key, tmp_path / "fetched.o")
+    assert backend.is_unreachable()
+
+
+def test_marked_remote_is_skipped(tmp_path, server):
+    url = f"http://127.0.0.1:{server.server_port}"
+    HttpBackend(url, tmp_path).put(Key, make_artifact(tmp_path))
+
+    # Marked by another process, for example after a timeout.
+    HttpBackend(url, tmp_path).mark_unreachable()
+
+    backend = HttpBackend(url, tmp_path)
+    assert backend.request("GET", Key) is None
+    assert not backend.get(Key, tmp_path / "fetched.o")
+
+    # Without a state directory nothing is remembered.
+    assert HttpBackend(url).get(Key, tmp_path / "fetched.o")
+
+
+def test_marker_is_per_remote(tmp_path):
+    backend = HttpBackend("http://127.0.0.1:1", tmp_path)
+    backend.mark_unreachable()
+
+    assert backend.is_unreachable()
+    assert not HttpBackend("http://127.0.0.1:2", tmp_path).is_unreachable()
+
+
+def test_make_backend(tmp_path):
+    assert isinstance(make_backend("https://cache.example.com"), HttpBackend)
+    assert isinstance(make_backend(str(tmp_path)), DirectoryBackend)
+    assert make_backend(f"file://{str(tmp_path)}").path == tmp_path
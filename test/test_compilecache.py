@@ -0,0 +1,83 @@
+from aim_build import compilecache
+from aim_build.compilecache import (
+    CompileCache,
+    compute_key,
+    preprocess_command,
+    split_compile_command,
+)
+
+Command = [
+    "g++",
+    "-O2",
+    "-Iinclude",
+    "-MMD",
+    "-MF",
+    "a/util.o.d",
+    "-c",
+    "src/util.cpp",
+    "-o",
+    "a/util.o",
+]
+
+
+def test_split_compile_command():
+    output, depfile, arguments = split_compile_command(Command)
+
+    assert output == "a/util.o"
+    assert depfile == "a/util.o.d"
+    assert arguments == ["-O2", "-Iinclude", "-MMD", "-c", "src/util.cpp"]
+
+
+def test_preprocess_command_keeps_the_depfile():
+    command = preprocess_command(Command, "a/util.o", "a/util.o.d")
+
+    assert command[0] == "g++"
+    assert "-E" in command and "-c" not in command
+    assert "-o" not in command
+    assert command[-4:] == ["-MF", "a/util.o.d", "-MT", "a/util.o"]
+
+
+def test_key_ignores_output_and_depfile_paths():
+    # The same source compiled the same way for different builds shares a cache entry.
+    other_build = [
+        argument.replace("a/", "b/") if argument.startswith("a/") else argument
+        for argument in Command
+    ]
+    assert other_build != Command
+
+    assert compute_key(Command, b"int x;") == compute_key(other_build, b"int x;")
+
+
+def test_key_changes_with_flags():
+    debug = ["-O0" if argument == "-O2" else argument for argument in Command]
+    assert compute_key(Command, b"int x;") != compute_key(debug, b"int x;")
+
+
+def test_key_changes_with_preprocessed_source():
+    assert compute_key(Command, b"int x;") != compute_key(Command, b"int y;")
+
+
+def test_key_changes_with_compiler():
+    clang = ["clang++"] + Command[1:]
+    assert compute_key(Command, b"int x;") != compute_key(clang, b"int x;")
+
+
+def test_stats_count_events(tmp_path):
+    cache = CompileCache(tmp_path)
+    for event in ["hit", "miss", "hit", "remote_hit"]:
+        cache.record(event)
+
+    stats = cache.stats()
+    assert (stats["hits"], stats["remote_hits"], stats["misses"]) == (2, 1, 1)
+
+
+def test_stats_file_is_compacted(tmp_path, monkeypatch):
+    monkeypatch.setattr(compilecache, "MaxStatsSize", 100)
+    cache = CompileCache(tmp_path)
+    for _ in range(200):
+        cache.record("hit")
+    cache.record("miss")
+
+    assert cache.stats_path.stat().st_size <= 100
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"]) == (200, 1)
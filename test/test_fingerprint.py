@@ -0,0 +1,101 @@
+import copy
+
+from aim_build.buildgraph import BuildGraph
+from aim_build.fingerprint import (
+    FingerprintFile,
+    build_files_missing,
+    fingerprint_builds,
+    load_fingerprints,
+    ninja_files_missing,
+    save_fingerprints,
+)
+
+Target = {
+    "compiler": "g++",
+    "flags": ["-std=c++17"],
+    "builds": [
+        {"name": "c", "buildRule": "staticlib", "srcDirs": ["c"]},
+        {"name": "b", "buildRule": "staticlib", "srcDirs": ["b"], "requires": ["c"]},
+        {"name": "a", "buildRule": "staticlib", "srcDirs": ["a"]},
+        {"name": "exe", "buildRule": "exe", "srcDirs": ["exe"], "requires": ["b"]},
+    ],
+}
+
+
+def fingerprint(parsed_toml):
+    return fingerprint_builds(parsed_toml, BuildGraph(parsed_toml["builds"]))
+
+
+def test_unchanged_target_has_unchanged_fingerprints():
+    assert fingerprint(Target) == fingerprint(copy.deepcopy(Target))
+
+
+def test_change_to_a_required_build_changes_its_dependants():
+    before = fingerprint(Target)
+    changed = copy.deepcopy(Target)
+    changed["builds"][0]["flags"] = ["-O2"]
+    after = fingerprint(changed)
+
+    assert [name for name in before if before[name] != after[name]] == [
+        "c",
+        "b",
+        "exe",
+    ]
+
+
+def test_global_change_changes_every_build():
+    before = fingerprint(Target)
+    changed = dict(Target, flags=["-std=c++20"])
+    after = fingerprint(changed)
+
+    assert all(before[name] != after[name] for name in before)
+
+
+def test_fingerprints_round_trip(tmp_path):
+    fingerprints = fingerprint(Target)
+    save_fingerprints(tmp_path, fingerprints)
+    assert load_fingerprints(tmp_path) == fingerprints
+
+
+def test_missing_manifest_regenerates_everything(tmp_path):
+    assert load_fingerprints(tmp_path) == {}
+    assert ninja_files_missing(tmp_path, ["a"])
+
+
+def test_corrupt_manifest_regenerates_everything(tmp_path):
+    (tmp_path / FingerprintFile).write_text("{not json")
+    assert load_fingerprints(tmp_path) == {}
+
+
+def test_manifest_of_another_version_regenerates_everything(tmp_path):
+    save_fingerprints(tmp_path, fingerprint(Target))
+    manifest = (tmp_path / FingerprintFile).read_text()
+    (tmp_path / FingerprintFile).write_text(
+        manifest.replace('"version": "', '"version": "0.0.0-other-')
+    )
+
+    assert load_fingerprints(tmp_path) == {}
+
+
+def test_missing_generated_files_regenerate_the_build(tmp_path):
+    unity_file = tmp_path / "a" / "unity" / "unity_0.cpp"
+    for path in [
+        tmp_path / "build.ninja",
+        tmp_path / "a" / "build.ninja",
+        tmp_path / "a" / "compile.ninja",
+        unity_file,
+    ]:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text("")
+
+    generated_files = {"a": [str(unity_file)]}
+    save_fingerprints(tmp_path, {"a": "fingerprint"}, generated_files)
+    assert not ninja_files_missing(tmp_path, ["a"])
+
+    unity_file.unlink()
+    assert build_files_missing(tmp_path, "a", generated_files)
+    assert ninja_files_missing(tmp_path, ["a"])
+
+
+def test_build_without_recorded_files_is_missing(tmp_path):
+    assert build_files_missing(tmp_path, "a", {})
@@ -0,0 +1,38 @@
+from pathlib import Path
+
+import pytest
+
+from aim_build.gccbuilds import check_object_clashes
+from aim_build.utils import mirror_path, src_to_o
+
+
+def test_mirror_path_keeps_directories():
+    project = Path("/project")
+    assert mirror_path(project / "a" / "util.cpp", project) == Path("a/util.cpp")
+    assert mirror_path(project / "b" / "util.cpp", project) == Path("b/util.cpp")
+
+
+def test_mirror_path_stays_under_the_build_directory():
+    # Sources outside the project must not be written outside the build directory.
+    mirrored = mirror_path(Path("/project/../shared/util.cpp"), Path("/project/app"))
+    assert ".." not in mirrored.parts
+    assert not mirrored.is_absolute()
+
+
+def test_same_file_name_in_different_directories_does_not_clash():
+    project = Path("/project")
+    src_files = [project / "a" / "util.cpp", project / "b" / "util.cpp"]
+    obj_files = src_to_o(src_files, project)
+
+    assert len(set(obj_files)) == 2
+    check_object_clashes(src_files, obj_files)
+
+
+def test_object_clashes_are_reported():
+    src_files = [Path("/project/util.cpp"), Path("/project/util.c")]
+    obj_files = ["util.o", "util.o"]
+
+    with pytest.raises(
+        RuntimeError, match="Multiple source files map to the same object file"
+    ):
+        check_object_clashes(src_files, obj_files)
@@ -0,0 +1,77 @@
+from aim_build.buildgraph import BuildGraph
+from aim_build.ninjalog import LogEntry, chain_duration, critical_path, last_run
+
+
+def test_last_run_starts_where_end_times_go_backwards():
+    entries = [
+        LogEntry(0, 100, "a/x.o"),
+        LogEntry(0, 300, "a/liba.a"),
+        # The next invocation.
+        LogEntry(0, 50, "a/x.o"),
+        LogEntry(50, 120, "a/liba.a"),
+    ]
+
+    assert last_run(entries) == entries[2:]
+
+
+def test_last_run_of_a_single_run():
+    entries = [LogEntry(0, 100, "a/x.o"), LogEntry(100, 200, "a/liba.a")]
+    assert last_run(entries) == entries
+
+
+def test_last_run_drops_repeated_outputs():
+    # An edge with several outputs is logged once per output.
+    entries = [LogEntry(0, 100, "a/x.o"), LogEntry(0, 100, "a/x.o")]
+    assert last_run(entries) == entries[:1]
+
+
+def test_critical_path_follows_requirements():
+    graph = BuildGraph(
+        [
+            {"name": "exe", "buildRule": "exe", "requires": ["slow", "fast"]},
+            {"name": "slow", "buildRule": "staticlib"},
+            {"name": "fast", "buildRule": "staticlib"},
+        ]
+    )
+    mapped = {
+        "slow": [
+            LogEntry(0, 100, "slow/pch/pre.h.gch"),
+            LogEntry(100, 500, "slow/a.o"),
+            LogEntry(100, 200, "slow/b.o"),
+            LogEntry(500, 550, "slow/libslow.a"),
+        ],
+        "fast": [LogEntry(0, 50, "fast/a.o"), LogEntry(50, 60, "fast/libfast.a")],
+        "exe": [LogEntry(0, 300, "exe/main.o"), LogEntry(550, 650, "exe/app.exe")],
+    }
+
+    path = critical_path(mapped, graph)
+
+    assert [entry.output for entry in path] == [
+        "slow/pch/pre.h.gch",
+        "slow/a.o",
+        "slow/libslow.a",
+        "exe/app.exe",
+    ]
+    assert chain_duration(path) == 650
+
+
+def test_critical_path_uses_own_compiles_when_slower():
+    graph = BuildGraph(
+        [
+            {"name": "exe", "buildRule": "exe", "requires": ["lib"]},
+            {"name": "lib", "buildRule": "staticlib"},
+        ]
+    )
+    mapped = {
+        "lib": [LogEntry(0, 10, "lib/a.o"), LogEntry(10, 20, "lib/liblib.a")],
+        "exe": [LogEntry(0, 300, "exe/main.o"), LogEntry(300, 400, "exe/app.exe")],
+    }
+
+    path = critical_path(mapped, graph)
+
+    assert [entry.output for entry in path] == ["exe/main.o", "exe/app.exe"]
+
+
+def test_critical_path_of_an_empty_log():
+    graph = BuildGraph([{"name": "lib", "buildRule": "staticlib"}])
+    assert critical_path({}, graph) == []
@@ -0,0 +1,102 @@
+import json
+import os
+
+from aim_build import srcscanner
+from aim_build.srcscanner import SourceScanner
+
+Patterns = ["*.cpp"]
+
+
+def make_files(root, paths):
+    for path in paths:
+        (root / path).parent.mkdir(parents=True, exist_ok=True)
+        (root / path).write_text("")
+
+
+def scan_names(scanner, project, directory="lib", excludes=None):
+    src_files, _ = scanner.scan(project / directory, project, Patterns, excludes)
+    return sorted(str(path.relative_to(project)) for path in src_files)
+
+
+def test_scan_is_recursive_and_matches_file_names(tmp_path):
+    make_files(tmp_path, ["lib/a.cpp", "lib/a.h", "lib/sub/b.cpp", "lib/.hidden/c.cpp"])
+
+    assert scan_names(SourceScanner(), tmp_path) == ["lib/a.cpp", "lib/sub/b.cpp"]
+
+
+def test_cached_listing_is_reused(tmp_path, monkeypatch):
+    make_files(tmp_path, ["lib/a.cpp", "lib/sub/b.cpp"])
+    cache_path = tmp_path / srcscanner.SourceCacheFile
+    scanner = SourceScanner(cache_path)
+    scan_names(scanner, tmp_path)
+    scanner.save()
+
+    def no_scandir(directory):
+        raise AssertionError(f"{directory} was listed again")
+
+    monkeypatch.setattr(srcscanner.os, "scandir", no_scandir)
+    assert scan_names(SourceScanner(cache_path), tmp_path) == [
+        "lib/a.cpp",
+        "lib/sub/b.cpp",
+    ]
+
+
+def test_added_file_invalidates_the_listing(tmp_path):
+    make_files(tmp_path, ["lib/a.cpp"])
+    # An old mtime, so adding a file changes it even on file systems with coarse timestamps.
+    os.utime(str(tmp_path / "lib"), (0, 0))
+    cache_path = tmp_path / srcscanner.SourceCacheFile
+    scanner = SourceScanner(cache_path)
+    scan_names(scanner, tmp_path)
+    scanner.save()
+
+    make_files(tmp_path, ["lib/b.cpp"])
+    assert scan_names(SourceScanner(cache_path), tmp_path) == [
+        "lib/a.cpp",
+        "lib/b.cpp",
+    ]
+
+
+def test_excluded_directory_is_not_scanned(tmp_path):
+    make_files(tmp_path, ["lib/a.cpp", "lib/tests/a_test.cpp", "lib/tests/deep/b.cpp"])
+    scanner = SourceScanner()
+
+    src_files, scanned_dirs = scanner.scan(
+        tmp_path / "lib", tmp_path, Patterns, ["lib/tests/*"]
+    )
+
+    assert [path.name for path in src_files] == ["a.cpp"]
+    assert tmp_path / "lib" / "tests" not in scanned_dirs
+    assert str(tmp_path / "lib" / "tests") not in scanner.visited
+
+
+def test_excluded_files(tmp_path):
+    make_files(tmp_path, ["lib/a.cpp", "lib/a_test.cpp", "lib/sub/b_test.cpp"])
+
+    assert scan_names(SourceScanner(), tmp_path, excludes=["*_test.cpp"]) == [
+        "lib/a.cpp"
+    ]
+
+
+def test_save_drops_directories_that_were_not_visited(tmp_path):
+    make_files(tmp_path, ["lib/a.cpp", "old/b.cpp"])
+    cache_path = tmp_path / srcscanner.SourceCacheFile
+    scanner = SourceScanner(cache_path)
+    scan_names(scanner, tmp_path, "lib")
+    scan_names(scanner, tmp_path, "old")
+    scanner.save()
+    assert str(tmp_path / "old") in json.loads(cache_path.read_text())
+
+    scanner = SourceScanner(cache_path)
+    scan_names(scanner, tmp_path, "lib")
+    scanner.save()
+
+    assert list(json.loads(cache_path.read_text())) == [str(tmp_path / "lib")]
+
+
+def test_corrupt_cache_is_rebuilt(tmp_path):
+    make_files(tmp_path, ["lib/a.cpp"])
+    cache_path = tmp_path / srcscanner.SourceCacheFile
+    cache_path.write_text("{not json")
+
+    assert scan_names(SourceScanner(cache_path), tmp_path) == ["lib/a.cpp"]
@@ -0,0 +1,63 @@
+from aim_build.buildgraph import BuildGraph
+from aim_build.watchmode import affected_builds, ninja_targets
+
+# core <- util <- app, core <- tests, and tools on its own.
+Graph = BuildGraph(
+    [
+        {"name": "core", "buildRule": "staticlib"},
+        {"name": "util", "buildRule": "staticlib", "requires": ["core"]},
+        {"name": "app", "buildRule": "exe", "requires": ["util"]},
+        {"name": "tests", "buildRule": "exe", "requires": ["core"]},
+        {"name": "tools", "buildRule": "exe"},
+    ]
+)
+
+Dirs = {
+    "core": {"/p/core", "/p/core/detail"},
+    "util": {"/p/util"},
+    "app": {"/p/app"},
+    "tests": {"/p/tests"},
+    "tools": {"/p/tools"},
+}
+
+
+def test_change_affects_the_build_and_its_dependants():
+    affected = affected_builds(["/p/core/detail/a.cpp"], Dirs, Graph)
+    assert affected == {"core", "util", "app", "tests"}
+
+
+def test_change_to_a_leaf_only_affects_the_leaf():
+    assert affected_builds(["/p/app/main.cpp"], Dirs, Graph) == {"app"}
+
+
+def test_change_outside_the_watched_directories():
+    assert affected_builds(["/elsewhere/a.cpp"], Dirs, Graph) == set()
+
+
+def test_directory_shared_by_builds():
+    dirs = dict(Dirs, tools={"/p/tools", "/p/util"})
+    assert affected_builds(["/p/util/u.h"], dirs, Graph) == {"util", "app", "tools"}
+
+
+def test_deleted_directory_is_matched_by_its_path():
+    assert affected_builds(["/p/core/detail"], Dirs, Graph) == {
+        "core",
+        "util",
+        "app",
+        "tests",
+    }
+
+
+def test_targets_leave_out_builds_an_affected_dependant_builds():
+    # Building app builds util and core, building tests builds core.
+    affected = {"core", "util", "app", "tests"}
+    assert ninja_targets(affected, Graph) == ["app", "tests"]
+
+
+def test_targets_of_independent_builds():
+    assert sorted(ninja_targets({"app", "tools"}, Graph)) == ["app", "tools"]
+
+
+def test_requirement_without_affected_dependants_is_a_target():
+    assert ninja_targets({"core"}, Graph) == ["core"]
+    assert ninja_targets(set(), Graph) == []